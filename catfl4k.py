@@ -14,37 +14,57 @@ import threading
 import math
 import time
 import os
-import wave
 import struct
-import random
-from tkinter import simpledialog, colorchooser
+import hashlib
+import functools
+import gc
+import tracemalloc
+import json
+import queue
+import re
+import sqlite3
+import argparse
+import platform
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+if __name__ == "__main__" and sys.argv[1:2] in (["render"], ["bench"]):
+    # One project per core: keep BLAS single-threaded in every render worker
+    # (and out of benchmark timings)
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECTION 0: AUTO-DEPENDENCY INSTALLER
 # ═══════════════════════════════════════════════════════════════════════════════
 
-def install_dependencies():
+def install_dependencies(packages=("numpy", "sounddevice")):
     print("🐱 Cat's Studio 26 is installing audio engines...")
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "numpy", "sounddevice"])
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *packages])
         print("✅ Installation complete! Launching Studio...")
     except Exception as e:
         print(f"❌ Auto-install failed: {e}")
-        print("Please run: pip install numpy sounddevice")
+        print(f"Please run: pip install {' '.join(packages)}")
         sys.exit(1)
 
 try:
     import numpy as np
-    import sounddevice as sd
-    import tkinter as tk
-    from tkinter import ttk, filedialog, messagebox, Canvas
 except ImportError:
-    install_dependencies()
+    install_dependencies(("numpy",))
     # Retry imports after install
     import numpy as np
-    import sounddevice as sd
+
+def import_gui():
+    """Import the audio device and Tk stack; headless commands (``render``, ``play``, ``bench``) never call this."""
+    global sd, tk, ttk, filedialog, messagebox, Canvas, simpledialog, colorchooser
+    try:
+        import sounddevice as sd
+    except ImportError:
+        install_dependencies(("sounddevice",))
+        import sounddevice as sd
     import tkinter as tk
-    from tkinter import ttk, filedialog, messagebox, Canvas
+    from tkinter import ttk, filedialog, messagebox, Canvas, simpledialog, colorchooser
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECTION 1: AUDIO ENGINE CORE (Standardized for stability)
@@ -53,28 +73,159 @@ except ImportError:
 SAMPLE_RATE = 44100
 BLOCK_SIZE = 512
 MAX_VOICES = 64
+PASS_STREAMS = 16  # cached pattern passes playing at once
+PASS_CACHE_BYTES = int(float(os.environ.get('CAT26_PASS_CACHE_MB', 256)) * 2**20)  # rendered pass budget
+CMD_QUEUE_SIZE = 256
+LOAD_STAGES = ('sequencer', 'voices', 'fx', 'meter', 'clip')  # timed callback stages
+LOAD_RING = 4096   # blocks of callback timing kept for the load meter (~48 s at 512)
+SCOPE_RING = 16384  # master output frames kept for the scope and spectrum
+SCOPE_WINDOW = 2048  # frames shown by the scope (~46 ms)
+SPECTRUM_FFT = 4096
+SPECTRUM_BINS = 48   # log-spaced bands from 30 Hz to 20 kHz
+ALLOC_AUDIT = os.environ.get('CAT26_ALLOC_AUDIT') == '1'  # debug: assert allocation-free callbacks
+ALLOC_AUDIT_WARMUP = 32
+ALLOC_AUDIT_SLACK = 4096
+IIR_CHUNK = 256    # samples per biquad matmul chunk (matrix cost grows with its square)
+OLA_DENSITY = 16   # mean self-overlap above which offline render uses FFT convolution
+RENDER_SEG = 1 << 15  # offline render segment in frames; a batch is RENDER_ROWS of them
+RENDER_ROWS = 16
+EXPORT_MEMORY = int(float(os.environ.get('CAT26_EXPORT_MB', 256)) * 2**20)  # render buffers of parallel stem exports
+MIXER_INSERTS = 10  # insert 0 is the master
+FX_SLOTS = 3       # effect slots per insert
+COMP_HOP = 64      # compressor envelope resolution in samples
+PROJECT_VERSION = 3  # 1: plain JSON, samples rebuilt from recipes; 2: + embedded sample bank; 3: pattern layers
+PATTERN_LAYERS = {'gate': (np.uint8, 0), 'vel': (np.float32, 1.0), 'prob': (np.float32, 1.0), 'shift': (np.float32, 0.0)}
+BPM_RANGE = (20, 300)  # tempos the transport accepts; set_bpm clamps into it
+PATTERN_LENGTHS = (16, 32, 64, 8)  # the rack's length button cycles through these
+PROJECT_MAGIC = b'CAT26PRJ'
+PROJECT_HEADER = struct.Struct('<8sIQQ')  # magic, JSON bytes, sample section offset, sample count
+PROJECT_ALIGN = 4096  # the sample section starts on a page boundary, so it maps in place
+FREEZE_CHUNK = 4096  # frames per effect block when freezing a channel
+FREEZE_FLOOR = 1e-5  # -100 dBFS: a frozen effect tail ends once it stays below this
+FREEZE_TAIL = 30     # seconds, longest frozen effect tail
+KIT_SEED = 26      # default kit is seeded, so it is reproducible and cacheable
+KIT_CACHE_VERSION = 2  # bump when a synth_* function changes its output
+KIT_CACHE_DIR = os.environ.get('CAT26_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'catstudio26', 'kit'))
+SAMPLE_DIR = os.environ.get('CAT26_SAMPLES', os.path.join(os.path.expanduser('~'), 'Music', 'Samples'))  # the browser's root
+SAMPLE_EXTS = ('.wav', '.wave')
+SAMPLE_CACHE_BYTES = int(float(os.environ.get('CAT26_SAMPLE_CACHE_MB', 256)) * 2**20)  # decoded sample files kept
+WAV_READ_CHUNK = 65536  # frames decoded per step when loading a sample file
+SAMPLE_DB = os.environ.get('CAT26_SAMPLE_DB', os.path.join(os.path.dirname(KIT_CACHE_DIR), 'samples.sqlite'))  # library index
+INDEX_BATCH = 256   # files analysed per index transaction (and progress message)
+SEARCH_LIMIT = 500  # browser search results shown
+INDEX_CLOSE_WAIT = 0.5  # seconds closing the app waits for a cancelled scan to let go of the index
 
 # ─── DSP / Synthesis ──────────────────────────────────────────────────────────
 
-def _butter_filter(data, cutoff, sr, btype='high', order=4):
-    """Numpy-based FFT filter to replace scipy."""
-    n = len(data)
-    if n == 0: return data
-    freqs = np.fft.rfftfreq(n, d=1/sr)
-    epsilon = 1e-10
-    
-    if btype == 'low':
-        gain = 1.0 / np.sqrt(1.0 + (freqs / (cutoff + epsilon))**(2 * order))
-    else:
-        with np.errstate(divide='ignore', invalid='ignore'):
-            gain = 1.0 / np.sqrt(1.0 + ((cutoff) / (freqs + epsilon))**(2 * order))
-        gain[0] = 0.0
-
-    spectrum = np.fft.rfft(data)
-    filtered = np.fft.irfft(spectrum * gain, n=n)
-    return filtered.astype(np.float32)
-
-def synth_kick(duration=0.5):
+def butter_sos(order, cutoff, sr=SAMPLE_RATE, btype='low'):
+    """Butterworth low/high-pass as second-order sections, rows [b0, b1, b2, a0, a1, a2]."""
+    w0 = 2 * math.pi * cutoff / sr
+    cw, sw = math.cos(w0), math.sin(w0)
+    sos = []
+    for k in range(order // 2):
+        q = 1 / (2 * math.sin((2 * k + 1) * math.pi / (2 * order)))
+        alpha = sw / (2 * q)
+        if btype == 'low':
+            b = [(1 - cw) / 2, 1 - cw, (1 - cw) / 2]
+        else:
+            b = [(1 + cw) / 2, -(1 + cw), (1 + cw) / 2]
+        sos.append(b + [1 + alpha, -2 * cw, 1 - alpha])
+    if order % 2:  # first-order section via the bilinear transform
+        kt = math.tan(w0 / 2)
+        b0 = kt / (1 + kt) if btype == 'low' else 1 / (1 + kt)
+        sos.append([b0, b0 if btype == 'low' else -b0, 0.0, 1.0, (kt - 1) / (kt + 1), 0.0])
+    return np.array(sos)
+
+@functools.lru_cache(maxsize=64)
+def _section_matrix(sec, k):
+    """(k + 4, k) float64 block matrix of one biquad; cached, since synths reuse the same designs."""
+    b0, b1, b2, a0, a1, a2 = np.array(sec) / sec[3]
+    # All-pole impulse response h and zero-input responses to y[-2] = 1 and y[-1] = 1
+    h, z2, z1 = np.zeros(k), np.zeros(k), np.zeros(k)
+    hp = (0.0, 0.0); p2 = (1.0, 0.0); p1 = (0.0, 1.0)  # (y[n-2], y[n-1])
+    for n in range(k):
+        h[n] = (1.0 if n == 0 else 0.0) - a1 * hp[1] - a2 * hp[0]
+        z2[n] = -a1 * p2[1] - a2 * p2[0]
+        z1[n] = -a1 * p1[1] - a2 * p1[0]
+        hp, p2, p1 = (hp[1], h[n]), (p2[1], z2[n]), (p1[1], z1[n])
+    # FIR taps: v[n] = b0 x[n] + b1 x[n-1] + b2 x[n-2], rows indexed over [x[-2], x[-1], x[0:k]]
+    ar = np.arange(k)
+    fir = np.zeros((k + 2, k))
+    fir[ar + 2, ar] = b0
+    fir[ar + 1, ar] = b1
+    fir[ar, ar] = b2
+    lag = ar[None, :] - ar[:, None]  # column n, row j -> h[n - j]
+    toeplitz = np.where(lag >= 0, h[np.clip(lag, 0, k - 1)], 0.0)
+    return np.vstack([fir @ toeplitz, z2, z1])
+
+class BiquadCascade:
+    """Stateful cascade of second-order sections, filtering (channels, frames) blocks.
+
+    A section is exact over a chunk of k samples: its output is one matmul of
+    [x[-2], x[-1], x[0:k], y[-2], y[-1]] with a (k + 4, k) matrix built from the
+    section's impulse and zero-input responses. State carries between calls, so
+    the same object works per block in the callback and in chunks offline.
+    Matrices and scratch are built once per block size.
+
+    Matrices, state and the signal between sections are float64 whatever the
+    buffers' type; only the output is cast. Low-cutoff sections (poles near
+    z = 1, like the EQ's 30 Hz low cut) lose several digits to the matrix
+    form, which float32 cannot spare: ``bench`` checks the cascade against a
+    direct-form reference.
+    """
+    def __init__(self, sos, channels=1):
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        self.channels = channels
+        self.state = np.zeros((len(self.sos), channels, 4))  # x[-2], x[-1], y[-2], y[-1]
+        self.frames = 0
+
+    def reset(self):
+        self.state.fill(0)
+
+    def prepare(self, frames):
+        if frames == self.frames: return
+        self.frames = frames
+        m = min(frames, IIR_CHUNK)
+        self.chunks = [(c0, min(m, frames - c0)) for c0 in range(0, frames, m)]
+        self.work = np.zeros((self.channels, frames))
+        self.mats = {}
+        for _, k in self.chunks:
+            if k not in self.mats:
+                self.mats[k] = ([_section_matrix(tuple(sec), k) for sec in self.sos],
+                                np.zeros((self.channels, k + 4)), np.zeros((self.channels, k)))
+
+    def process(self, x, out=None):
+        """Filter ``x`` (channels, frames) into ``out`` (defaults to in place)."""
+        if out is None: out = x
+        self.prepare(x.shape[1])
+        work = self.work
+        work[...] = x
+        for s in range(len(self.sos)):
+            st = self.state[s]
+            for c0, k in self.chunks:
+                mats, ext, y = self.mats[k]
+                ext[:, :2] = st[:, :2]
+                ext[:, 2:k+2] = work[:, c0:c0+k]
+                ext[:, k+2:] = st[:, 2:]
+                np.matmul(ext, mats[s], out=y)
+                st[:, :2] = ext[:, k:k+2]
+                if k >= 2:
+                    st[:, 2:] = y[:, k-2:]
+                else:
+                    st[:, 2] = st[:, 3]
+                    st[:, 3] = y[:, 0]
+                work[:, c0:c0+k] = y
+        out[...] = work
+        return out
+
+def sosfilt(sos, data):
+    """Offline convenience: filter a mono buffer through a fresh cascade."""
+    y = np.array(data, dtype=np.float64)[None, :]
+    if y.shape[1] == 0: return y[0].astype(np.float32)
+    return BiquadCascade(sos, 1).process(y)[0].astype(np.float32)
+
+def synth_kick(duration=0.5, seed=None):
+    rng = np.random.default_rng(seed)
     n = int(SAMPLE_RATE * duration)
     t = np.arange(n) / SAMPLE_RATE
     # Pitch envelope
@@ -82,40 +233,43 @@ def synth_kick(duration=0.5):
     phase = 2 * np.pi * np.cumsum(freq) / SAMPLE_RATE
     sig = np.sin(phase) * np.exp(-t / 0.3)
     # Transient
-    click = np.random.normal(0, 1, int(0.005 * SAMPLE_RATE)) * 0.5
+    click = rng.normal(0, 1, int(0.005 * SAMPLE_RATE)) * 0.5
     sig[:len(click)] += click
     max_val = np.max(np.abs(sig))
     return (sig / max_val).astype(np.float32) if max_val > 0 else sig
 
-def synth_snare(duration=0.25):
+def synth_snare(duration=0.25, seed=None):
+    rng = np.random.default_rng(seed)
     n = int(SAMPLE_RATE * duration)
     t = np.arange(n) / SAMPLE_RATE
     tone = np.sin(2 * np.pi * 180 * t) * np.exp(-t / 0.05)
-    noise = np.random.normal(0, 1, n) * np.exp(-t / 0.12)
-    noise = _butter_filter(noise, 1000, SAMPLE_RATE, 'high')
+    noise = rng.normal(0, 1, n) * np.exp(-t / 0.12)
+    noise = sosfilt(butter_sos(4, 1000, SAMPLE_RATE, 'high'), noise)
     sig = 0.4 * tone + 0.6 * noise
     max_val = np.max(np.abs(sig))
     return (sig / max_val).astype(np.float32) if max_val > 0 else sig
 
-def synth_hat(duration=0.08, open_hat=False):
+def synth_hat(duration=0.08, open_hat=False, seed=None):
+    rng = np.random.default_rng(seed)
     n = int(SAMPLE_RATE * duration)
     t = np.arange(n) / SAMPLE_RATE
     # Metallic noise
-    sig = np.random.normal(0, 1, n)
+    sig = rng.normal(0, 1, n)
     # Add square waves for metallic body
     for f in [300, 540, 800]:
         sig += np.sign(np.sin(2 * np.pi * f * t)) * 0.2
-    sig = _butter_filter(sig, 7000, SAMPLE_RATE, 'high')
+    sig = sosfilt(butter_sos(4, 7000, SAMPLE_RATE, 'high'), sig)
     decay = 0.3 if open_hat else 0.04
     sig *= np.exp(-t / decay)
     max_val = np.max(np.abs(sig))
     return (sig / max_val).astype(np.float32) if max_val > 0 else sig
 
-def synth_clap(duration=0.4):
+def synth_clap(duration=0.4, seed=None):
+    rng = np.random.default_rng(seed)
     n = int(SAMPLE_RATE * duration)
     t = np.arange(n) / SAMPLE_RATE
-    noise = np.random.normal(0, 1, n)
-    noise = _butter_filter(noise, 1200, SAMPLE_RATE, 'high')
+    noise = rng.normal(0, 1, n)
+    noise = sosfilt(butter_sos(4, 1200, SAMPLE_RATE, 'high'), noise)
     # Burst envelope
     env = np.zeros(n)
     for i in range(4):
@@ -127,159 +281,2360 @@ def synth_clap(duration=0.4):
     max_val = np.max(np.abs(sig))
     return (sig / max_val).astype(np.float32) if max_val > 0 else sig
 
+SYNTHS = {fn.__name__: fn for fn in (synth_kick, synth_snare, synth_hat, synth_clap)}  # channel 'source' recipes
+
+# ─── Kit Cache ────────────────────────────────────────────────────────────────
+
+def kit_cache_path(fn, seed, **params):
+    """Cache file for one synth call, keyed by function, parameters, seed and rate."""
+    key = repr((fn.__name__, sorted(params.items()), seed, SAMPLE_RATE, KIT_CACHE_VERSION))
+    return os.path.join(KIT_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+def load_cached(fn, seed, **params):
+    """Memory-mapped cached buffer, or None on a miss (unseeded calls are never cached)."""
+    if seed is None: return None
+    path = kit_cache_path(fn, seed, **params)
+    try:
+        return np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+def synth_cached(fn, seed, **params):
+    """Synthesize and store in the cache; the file is renamed into place when complete."""
+    data = fn(seed=seed, **params)
+    if seed is not None:
+        path = kit_cache_path(fn, seed, **params)
+        try:
+            os.makedirs(KIT_CACHE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # read-only home etc.: keep running uncached
+    return data
+
+# ─── WAV Output ───────────────────────────────────────────────────────────────
+
+WAV_FORMATS = {'pcm16': (1, 2), 'pcm24': (1, 3), 'float32': (3, 4)}  # fmt -> (format tag, bytes)
+
+class WavWriter:
+    """Streaming stereo WAV writer: 16-bit (TPDF dither), 24-bit or 32-bit float.
+
+    Blocks are converted and written as they arrive; the RIFF sizes are
+    patched on close, so memory use does not depend on the file length.
+    """
+    def __init__(self, path, fmt='pcm16', dither=True, channels=2):
+        self.tag, self.width = WAV_FORMATS[fmt]
+        self.fmt = fmt
+        self.dither = dither and fmt == 'pcm16'
+        self.channels = channels
+        self.frames = 0
+        self.rng = np.random.default_rng()
+        self.f = open(path, 'wb')
+        fmt_len = 18 if self.tag == 3 else 16
+        block_align = channels * self.width
+        self.f.write(b'RIFF\0\0\0\0WAVE')
+        self.f.write(struct.pack('<4sIHHIIHH', b'fmt ', fmt_len, self.tag, channels, SAMPLE_RATE,
+                                 SAMPLE_RATE * block_align, block_align, self.width * 8))
+        if self.tag == 3:
+            self.f.write(struct.pack('<H4sII', 0, b'fact', 4, 0))
+        self.f.write(b'data\0\0\0\0')
+        self.data_start = self.f.tell()
+
+    def write(self, block):
+        if self.fmt == 'float32':
+            data = block.astype('<f4')
+        else:
+            scale = 32767 if self.fmt == 'pcm16' else 8388607
+            # float32 is ample for 16-bit (errors only at rounding ties, far below the dither)
+            work = np.float32 if self.fmt == 'pcm16' else np.float64
+            x = np.multiply(block, scale, dtype=work)
+            if self.dither:  # TPDF: sum of two uniform LSB-wide noises
+                x += self.rng.random(x.shape, dtype=work)
+                x -= self.rng.random(x.shape, dtype=work)
+            np.rint(x, out=x)
+            np.clip(x, -scale - 1, scale, out=x)
+            if self.fmt == 'pcm16':
+                data = x.astype('<i2')
+            else:
+                data = x.astype('<i4').view(np.uint8).reshape(-1, 4)[:, :3]
+        self.f.write(data.tobytes())
+        self.frames += len(block)
+
+    def close(self):
+        size = self.f.tell() - self.data_start
+        if size % 2: self.f.write(b'\0')
+        end = self.f.tell()
+        self.f.seek(4)
+        self.f.write(struct.pack('<I', end - 8))
+        if self.tag == 3:
+            self.f.seek(self.data_start - 12)
+            self.f.write(struct.pack('<I', self.frames))
+        self.f.seek(self.data_start - 4)
+        self.f.write(struct.pack('<I', size))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def drain(q):
+    """Everything put on queue ``q`` so far, without waiting."""
+    out = []
+    while True:
+        try:
+            out.append(q.get_nowait())
+        except queue.Empty:
+            return out
+
+class ExportJob:
+    """An export running on a worker thread, so the UI keeps going meanwhile.
+
+    ``fn`` is an engine export taking ``progress`` and ``cancel`` keywords.
+    The worker posts to ``messages``: ('progress', fraction) as it renders,
+    then one of ('done', result), ('cancelled', None) or ('error', exception).
+    The UI polls the queue; ``cancel`` only sets an event the export checks
+    between render batches.
+    """
+    def __init__(self, fn, *args, **kwargs):
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(fn, args, kwargs), name="export", daemon=True)
+        self.thread.start()
+
+    def _run(self, fn, args, kwargs):
+        try:
+            result = fn(*args, progress=lambda f: self.messages.put(('progress', f)), cancel=self.cancelled, **kwargs)
+        except Exception as e:
+            self.messages.put(('error', e))
+            return
+        self.messages.put(('cancelled', None) if result is None else ('done', result))
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def poll(self):
+        """Messages posted since the last poll, without waiting."""
+        return drain(self.messages)
+
+# ─── Sample Files ─────────────────────────────────────────────────────────────
+
+class LRUCache:
+    """Items by key, each with a size in bytes; past ``limit`` bytes the least
+    recently used go. Not locked: each owner touches it from one thread (or
+    under its own lock).
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.items = OrderedDict()  # key -> (item, size)
+        self.bytes = 0
+
+    def get(self, key):
+        entry = self.items.get(key)
+        if entry is None: return None
+        self.items.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, item, size):
+        if key in self.items: return
+        self.items[key] = (item, size)
+        self.bytes += size
+        while self.bytes > self.limit:
+            _, (_, old) = self.items.popitem(last=False)
+            self.bytes -= old
+
+WAV_DTYPES = {(1, 1): np.uint8, (1, 2): '<i2', (1, 3): np.uint8, (1, 4): '<i4', (3, 4): '<f4', (3, 8): '<f8'}  # (tag, bytes)
+WavInfo = namedtuple('WavInfo', 'tag channels rate width start frames')
+
+def wav_info(path):
+    """Parse a WAV header: walks the RIFF chunks with ``struct`` up to the sample data.
+
+    Reads 8/16/24/32-bit PCM containers (any valid bit depth inside them, so
+    12- and 20-bit too) and 32/64-bit float, plain or extensible
+    (``WavWriter`` output included). ``frames`` counts what the file really
+    holds, which for a truncated or still-growing file is less than its
+    header says. Raises ValueError on anything else.
+    """
+    with open(path, 'rb') as f:
+        riff, _, form = struct.unpack('<4sI4s', f.read(12).ljust(12, b'\0'))
+        if riff != b'RIFF' or form != b'WAVE': raise ValueError(f"not a WAV file: {path}")
+        fmt = None
+        while True:
+            head = f.read(8)
+            if len(head) < 8: raise ValueError(f"WAV file has no data: {path}")
+            cid, size = struct.unpack('<4sI', head)
+            if cid == b'data': break
+            body = f.read(size + size % 2)
+            if cid == b'fmt ' and size >= 16:
+                fmt = struct.unpack('<HHIIHH', body[:16])
+                if fmt[0] == 0xFFFE and size >= 26:  # WAVE_FORMAT_EXTENSIBLE: the subformat GUID starts with the tag
+                    fmt = (struct.unpack('<H', body[24:26])[0],) + fmt[1:]
+        start = f.tell()
+    if fmt is None: raise ValueError(f"WAV file has no format: {path}")
+    tag, channels, rate, _, align, bits = fmt
+    width = align // channels if channels > 0 else 0  # the container; 20-bit audio sits in 3 bytes, 12-bit in 2
+    if (tag, width) not in WAV_DTYPES or align != channels * width or not 0 < bits <= 8 * width or rate < 1:
+        raise ValueError(f"unsupported WAV format ({tag}, {bits} bit in {align}-byte frames): {path}")
+    frames = min(size, os.path.getsize(path) - start) // (channels * width)
+    if frames <= 0: raise ValueError(f"WAV file has no audio: {path}")
+    return WavInfo(tag, channels, rate, width, start, frames)
+
+def wav_chunks(path, info):
+    """The file's samples as float32 (frames, channels) blocks of ``WAV_READ_CHUNK`` frames,
+    decoded from a memory map, so a long file never has a full-size temporary.
+    """
+    tag, channels, _, width, start, frames = info
+    raw = np.memmap(path, dtype=WAV_DTYPES[tag, width], mode='r', offset=start, shape=(frames, channels * (3 if width == 3 else 1)))
+    scale = np.float32({1: 1 / 128, 2: 1 / 32768, 3: 1 / 2**31, 4: 1 / 2**31}[width] if tag == 1 else 1.0)
+    for i in range(0, frames, WAV_READ_CHUNK):
+        block = raw[i:i + WAV_READ_CHUNK]
+        if width == 3:  # little-endian 24-bit into the top of an int32, which carries the sign
+            b = block.reshape(len(block), channels, 3).astype(np.int32)
+            block = (b[..., 0] << 8) | (b[..., 1] << 16) | (b[..., 2] << 24)
+        elif tag == 1 and width == 1:  # 8-bit is unsigned
+            block = block.astype(np.int16) - 128
+        yield block.astype(np.float32) * scale
+
+def read_wav(path):
+    """A WAV file (see ``wav_info``) as mono float32 at ``SAMPLE_RATE``: channels are
+    averaged, other rates are resampled linearly.
+    """
+    info = wav_info(path)
+    out, i = np.empty(info.frames, dtype=np.float32), 0
+    for block in wav_chunks(path, info):
+        out[i:i + len(block)] = block.mean(axis=1)
+        i += len(block)
+    if info.rate != SAMPLE_RATE:
+        n = max(1, int(info.frames * SAMPLE_RATE / info.rate))
+        out = np.interp(np.arange(n) * (info.rate / SAMPLE_RATE), np.arange(info.frames), out).astype(np.float32)
+    return out
+
+def list_samples(folder):
+    """A folder's sub-folders and sample files as two sorted lists of paths; hidden entries are skipped."""
+    dirs, files = [], []
+    with os.scandir(folder) as it:
+        for e in it:
+            if e.name.startswith('.'): continue
+            if e.is_dir():
+                dirs.append(e.path)
+            elif e.name.lower().endswith(SAMPLE_EXTS):
+                files.append(e.path)
+    key = lambda p: os.path.basename(p).lower()
+    return sorted(dirs, key=key), sorted(files, key=key)
+
+class SampleIndex:
+    """The sample library's metadata in SQLite, kept current by a background scan.
+
+    ``samples`` holds one row per WAV file: path, folder, name, mtime and size
+    (which say whether a file changed), then frames, channels, rate, duration
+    and the peak and RMS over all channels (NULL if unreadable). ``folders``
+    holds the tree, so the browser lists any indexed folder from the database
+    at once instead of walking the disk.
+
+    ``scan`` runs on a worker thread with its own connection. It walks the
+    folder, drops rows of files that are gone and analyses only new or changed
+    files, newest first, committing every ``INDEX_BATCH`` files, so the
+    index fills in while the UI reads it (WAL journal: readers never wait on
+    the writer). Messages for the UI, like ``ExportJob``: ('progress', done,
+    total) per batch, then ('done', (files, analysed, removed)) or
+    ('cancelled', None). Cancelling is checked between files and while one is
+    read, and never waited for: each scan has its own event and generation,
+    and ``poll`` drops the messages of scans that were superseded. A
+    cancelled scan keeps its committed rows; the next one picks up the rest.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS samples (
+            path TEXT PRIMARY KEY, folder TEXT NOT NULL, name TEXT NOT NULL,
+            mtime INTEGER NOT NULL, size INTEGER NOT NULL,
+            frames INTEGER, channels INTEGER, rate INTEGER, duration REAL, peak REAL, rms REAL);
+        CREATE INDEX IF NOT EXISTS samples_folder ON samples (folder);
+        CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, parent TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+    """
+
+    def __init__(self, path=SAMPLE_DB):
+        self.path = path
+        if path != ':memory:': os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = self._connect()  # the UI thread's
+        self.messages = queue.Queue()  # (generation, message)
+        self.cancelled = threading.Event()  # the current scan's
+        self.generation = 0
+        self.thread = None
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(self.SCHEMA)
+        return db
+
+    # ─── Queries (UI thread) ──────────────────────────────────────────────
+
+    def children(self, folder):
+        """An indexed folder's sub-folders and sample files as ``list_samples`` gives them,
+        or None if the folder is not indexed (yet).
+        """
+        folder = os.path.abspath(folder)
+        if self.db.execute("SELECT 1 FROM folders WHERE path = ?", (folder,)).fetchone() is None: return None
+        dirs = [r[0] for r in self.db.execute("SELECT path FROM folders WHERE parent = ?", (folder,))]
+        files = [r[0] for r in self.db.execute("SELECT path FROM samples WHERE folder = ?", (folder,))]
+        key = lambda p: os.path.basename(p).lower()
+        return sorted(dirs, key=key), sorted(files, key=key)
+
+    def search(self, query, root=None, limit=SEARCH_LIMIT):
+        """Indexed files under ``root`` matching ``query``, as (path, duration) by name.
+
+        Every word must appear in the file name (any case); ``<2``, ``>0.5s``
+        and the like bound the duration in seconds.
+        """
+        where, args = [], []
+        for word in query.split():
+            bound = re.fullmatch(r'([<>]=?)(\d+\.?\d*|\.\d+)s?', word)
+            if bound:
+                where.append(f"duration {bound[1]} ?")
+                args.append(float(bound[2]))
+            else:
+                where.append("name LIKE ? ESCAPE '\\'")
+                args.append('%' + re.sub(r'([%_\\])', r'\\\1', word) + '%')
+        if root is not None:
+            prefix = os.path.join(os.path.abspath(root), '')
+            where.append("substr(path, 1, ?) = ?")
+            args += [len(prefix), prefix]
+        sql = "SELECT path, duration FROM samples" + (" WHERE " + " AND ".join(where) if where else "")
+        return self.db.execute(sql + " ORDER BY name COLLATE NOCASE LIMIT ?", args + [limit]).fetchall()
+
+    # ─── Scanning (worker thread) ─────────────────────────────────────────
+
+    def scan(self, root):
+        """Index ``root`` in the background. A scan still running is cancelled, not
+        waited for: it ends at its next file while this one starts.
+        """
+        self.stop()
+        self.generation += 1
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._scan, args=(os.path.abspath(root), self.generation, self.cancelled),
+                                       name="sample-index", daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=0.0):
+        """Cancel the running scan, waiting at most ``wait`` seconds for it to end."""
+        if self.thread is not None:
+            self.cancelled.set()
+            if wait: self.thread.join(wait)
+            self.thread = None
+
+    def poll(self):
+        """Messages of the latest scan posted since the last poll, without waiting."""
+        return [msg for gen, msg in drain(self.messages) if gen == self.generation]
+
+    def _scan(self, root, gen, cancelled):
+        post = lambda msg: self.messages.put((gen, msg))
+        try:
+            db = self._connect()
+            try:
+                post(self._update(db, root, cancelled, post))
+            finally:
+                db.close()
+        except (OSError, sqlite3.Error) as e:
+            post(('error', e))
+
+    def _update(self, db, root, cancelled, post):
+        prefix = os.path.join(root, '')
+        under = "(path = ? OR substr(path, 1, ?) = ?)"
+        known = {p: (m, n) for p, m, n in db.execute(f"SELECT path, mtime, size FROM samples WHERE {under}", (root, len(prefix), prefix))}
+        # Walk first; a cancelled walk has not seen everything, so it must not delete anything.
+        # An unreadable root is an error; an unreadable subfolder keeps whatever it had indexed.
+        folders, files, stack, skipped = [(root, os.path.dirname(root))], [], [root], []
+        while stack:
+            if cancelled.is_set(): return ('cancelled', None)
+            folder = stack.pop()
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                if folder == root: raise
+                skipped.append(os.path.join(folder, ''))
+                continue
+            for e in entries:
+                if e.name.startswith('.'): continue
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        folders.append((e.path, folder))
+                        stack.append(e.path)
+                    elif e.name.lower().endswith(SAMPLE_EXTS):
+                        st = e.stat()
+                        files.append((st.st_mtime_ns, st.st_size, e.path))
+                except OSError:
+                    continue
+        unseen = lambda p: p.startswith(tuple(skipped))
+        gone = {p for p in known.keys() - {p for _, _, p in files} if not unseen(p)}
+        stale = [(p,) for p, in db.execute(f"SELECT path FROM folders WHERE {under}", (root, len(prefix), prefix)) if not unseen(p)]
+        with db:
+            db.executemany("DELETE FROM folders WHERE path = ?", stale)
+            db.executemany("INSERT OR REPLACE INTO folders VALUES (?, ?)", folders)
+            db.executemany("DELETE FROM samples WHERE path = ?", [(p,) for p in gone])
+        changed = sorted((f for f in files if known.get(f[2]) != f[:2]), reverse=True)  # newest first
+        for b in range(0, len(changed), INDEX_BATCH):
+            rows = []
+            for mtime, size, path in changed[b:b + INDEX_BATCH]:
+                stats = self.analyse(path, cancelled)
+                if cancelled.is_set(): break  # keep the files done so far
+                rows.append((path, os.path.dirname(path), os.path.basename(path), mtime, size) + stats)
+            with db:
+                db.executemany("INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            if cancelled.is_set(): return ('cancelled', None)
+            post(('progress', b + len(rows), len(changed)))
+        return ('done', (len(files), len(changed), len(gone)))
+
+    @staticmethod
+    def analyse(path, cancelled=None):
+        """(frames, channels, rate, duration, peak, rms) of a WAV file; all None if it cannot
+        be read. Setting ``cancelled`` stops reading at the next chunk (the result is then junk).
+        """
+        try:
+            info = wav_info(path)
+            peak, power = 0.0, 0.0
+            for block in wav_chunks(path, info):
+                if cancelled is not None and cancelled.is_set(): break
+                peak = max(peak, float(np.max(np.abs(block))))
+                power += float(np.einsum('ij,ij->', block, block, dtype=np.float64))
+        except (OSError, ValueError):
+            return (None,) * 6
+        return (info.frames, info.channels, info.rate, info.frames / info.rate,
+                peak, math.sqrt(power / (info.frames * info.channels)))
+
+# ─── Mixer ────────────────────────────────────────────────────────────────────
+
+class EqFx:
+    """Low-cut / high-cut EQ on a stereo bus; a corner of 0 Hz disables that band."""
+    linear = True  # output of a sum is the sum of outputs, so a freeze can bake it
+
+    def __init__(self, low_cut=30.0, high_cut=18000.0, order=2):
+        secs = []
+        if low_cut > 0: secs.append(butter_sos(order, low_cut, SAMPLE_RATE, 'high'))
+        if high_cut > 0: secs.append(butter_sos(order, high_cut, SAMPLE_RATE, 'low'))
+        self.filt = BiquadCascade(np.vstack(secs), 2) if secs else None
+
+    def process(self, bus):
+        if self.filt is not None: self.filt.process(bus)
+
+class CompressorFx:
+    """Feed-forward peak compressor.
+
+    Peaks are taken per ``COMP_HOP`` samples in one reduction. Only the
+    envelope (one-pole attack/release at hop rate) runs as a Python loop, and
+    its gain is held for the hop and applied as one per-sample gain row.
+
+    Hops lie on a grid that runs on across blocks (a hop cut by the block end
+    carries its running peak into the next block), and each hop plays at the
+    gain of the envelope after the hop before it. So the output does not
+    depend on how the signal is split into blocks: the callback and offline
+    renders agree, for one hop of detector latency.
+    """
+    linear = False  # the gain follows the level of the whole signal: a freeze cannot bake it
+
+    def __init__(self, threshold=-18.0, ratio=4.0, attack=5.0, release=120.0, makeup=0.0):
+        hop_ms = 1000 * COMP_HOP / SAMPLE_RATE
+        self.thresh = 10 ** (threshold / 20)
+        self.slope = 1 - 1 / ratio
+        self.att = math.exp(-hop_ms / attack)
+        self.rel = math.exp(-hop_ms / release)
+        self.makeup = 10 ** (makeup / 20)
+        self.env = 0.0
+        self.hold = self.makeup  # gain of the current hop
+        self.phase = 0           # samples of the current hop already seen
+        self.run_peak = 0.0      # their peak
+        self.frames = 0
+
+    def prepare(self, frames):
+        if frames == self.frames: return
+        self.frames = frames
+        hops = frames // COMP_HOP + 1
+        self.abs = np.zeros((2, frames), dtype=np.float32)
+        self.mono = np.zeros(frames, dtype=np.float32)
+        self.peaks = np.zeros(hops, dtype=np.float32)
+        self.hop_gain = np.ones(hops, dtype=np.float32)
+        self.gain = np.ones(frames, dtype=np.float32)
+
+    def _step(self, peak):
+        # Advance the envelope over one complete hop; returns the gain of the next
+        env = peak + (self.att if peak > self.env else self.rel) * (self.env - peak)
+        self.env = env
+        return self.makeup * (env / self.thresh) ** -self.slope if env > self.thresh else self.makeup
+
+    def process(self, bus):
+        frames = bus.shape[1]
+        if frames == 0: return
+        self.prepare(frames)
+        np.abs(bus, out=self.abs)
+        mono, gain = self.mono, self.gain
+        np.maximum(self.abs[0], self.abs[1], out=mono)
+        # The rest of the hop in progress
+        head = min(COMP_HOP - self.phase, frames)
+        gain[:head].fill(self.hold)
+        self.run_peak = max(self.run_peak, float(mono[:head].max()))
+        self.phase += head
+        if self.phase == COMP_HOP:
+            self.hold = self._step(self.run_peak)
+            self.phase, self.run_peak = 0, 0.0
+        # Whole hops, then the start of the next one
+        full = (frames - head) // COMP_HOP
+        if full:
+            end = head + full * COMP_HOP
+            peaks, hop_gain = self.peaks[:full], self.hop_gain[:full]
+            np.max(mono[head:end].reshape(full, COMP_HOP), axis=1, out=peaks)
+            for h, peak in enumerate(peaks.tolist()):
+                hop_gain[h] = self.hold
+                self.hold = self._step(peak)
+            gain[head:end].reshape(full, COMP_HOP)[:] = hop_gain[:, None]
+        tail = head + full * COMP_HOP
+        if tail < frames:
+            gain[tail:].fill(self.hold)
+            self.run_peak = float(mono[tail:].max())
+            self.phase = frames - tail
+        np.multiply(bus[0], gain, out=bus[0])
+        np.multiply(bus[1], gain, out=bus[1])
+
+class DelayFx:
+    """Stereo feedback delay on a circular line; blocks longer than the delay are split."""
+    linear = True
+
+    def __init__(self, time=375.0, feedback=0.35, mix=0.3):
+        self.n = max(1, int(time * SAMPLE_RATE / 1000))
+        self.feedback = feedback
+        self.mix = mix
+        self.line = np.zeros((2, self.n), dtype=np.float32)
+        self.w = 0  # oldest sample, i.e. the one delayed by exactly n
+        self.tmp = np.zeros((2, 2, 0), dtype=np.float32)
+
+    def _ring(self, buf, write):
+        k = buf.shape[1]
+        a = min(k, self.n - self.w)
+        if write:
+            self.line[:, self.w:self.w+a] = buf[:, :a]
+            self.line[:, :k-a] = buf[:, a:]
+        else:
+            buf[:, :a] = self.line[:, self.w:self.w+a]
+            buf[:, a:] = self.line[:, :k-a]
+
+    def process(self, bus):
+        frames = bus.shape[1]
+        if self.tmp.shape[2] != min(frames, self.n):
+            self.tmp = np.zeros((2, 2, min(frames, self.n)), dtype=np.float32)
+        for c0 in range(0, frames, self.n):
+            k = min(self.n, frames - c0)
+            x, d, e = bus[:, c0:c0+k], self.tmp[0, :, :k], self.tmp[1, :, :k]
+            self._ring(d, False)
+            np.multiply(d, self.feedback, out=e)
+            np.add(e, x, out=e)
+            self._ring(e, True)
+            np.multiply(d, self.mix, out=d)
+            np.add(x, d, out=x)
+            self.w = (self.w + k) % self.n
+
+MIXER_FX = {'eq': EqFx, 'comp': CompressorFx, 'delay': DelayFx}
+
+def make_fx(spec):
+    """Build an effect from its spec, e.g. ``{'type': 'delay', 'time': 250.0}``."""
+    params = {k: v for k, v in spec.items() if k != 'type'}
+    return MIXER_FX[spec['type']](**params)
+
+class MixerGraph:
+    """Mixer routing compiled for the audio thread.
+
+    Inserts that carry channels (plus everything downstream of them and the
+    master) get a stereo row pair in the bus array, master first. ``steps``
+    lists them in topological order, so each insert runs its FX, fader and
+    meter and is then summed into its target before the target runs.
+    Built on the UI thread whenever routing or FX change. Effects whose spec
+    is unchanged are taken over from ``previous``, so tails survive edits.
+    Inserts in ``baked`` skip their effects: a frozen channel carries them.
+    An insert other than the master without a target feeds the master.
+    """
+    def __init__(self, mixer, used, previous=None, baked=()):
+        self.mixer = [dict(m, fx=[dict(f) if f else None for f in m['fx']]) for m in mixer]
+        self.used = tuple(used)
+        self.baked = frozenset(baked)
+        self.targets = targets = [None if i == 0 else 0 if m['target'] is None else m['target']
+                                  for i, m in enumerate(self.mixer)]
+        active = {0}
+        for i in self.used:
+            while i is not None and i not in active:
+                active.add(i)
+                i = targets[i]
+        indeg = dict.fromkeys(active, 0)
+        for i in active:
+            if targets[i] is not None: indeg[targets[i]] += 1
+        ready = sorted(i for i in active if indeg[i] == 0)
+        order = []
+        while ready:
+            i = ready.pop(0)
+            order.append(i)
+            t = targets[i]
+            if t is not None:
+                indeg[t] -= 1
+                if indeg[t] == 0: ready.append(t)
+        if len(order) != len(active):
+            raise ValueError("mixer routing contains a cycle")
+
+        self.rows = np.full(len(self.mixer), -1, dtype=np.int64)
+        self.rows[sorted(active)] = np.arange(len(active))
+        self.buses = len(active)
+        old = previous.effects if previous is not None else {}
+        self.effects = {}  # (insert, slot) -> (spec, instance)
+        self.steps = []
+        for i in order:
+            chain = []
+            for s, spec in enumerate(self.mixer[i]['fx']):
+                if spec is None or i in self.baked: continue
+                prev = old.get((i, s))
+                fx = prev[1] if prev is not None and prev[0] == spec else make_fx(spec)
+                self.effects[(i, s)] = (spec, fx)
+                chain.append(fx)
+            t = targets[i]
+            self.steps.append((i, int(self.rows[i]), tuple(chain), float(self.mixer[i]['vol']),
+                               -1 if t is None else int(self.rows[t])))
+
+    def offline(self, inserts):
+        """Fresh graph for an offline render, given each channel's insert.
+
+        An insert without effects only scales its input. So its fader is folded
+        into the gain of the channels that reach it, and they go straight to the
+        first insert with effects downstream (or the master). Returns the graph,
+        plus each channel's bus row and gain.
+        """
+        dest, gain = [], []
+        for i in range(len(self.mixer)):
+            g = 1.0
+            while i != 0 and (i in self.baked or not any(self.mixer[i]['fx'])):
+                g *= self.mixer[i]['vol']
+                i = self.targets[i]
+            dest.append(i)
+            gain.append(g)
+        dest, gain = np.array(dest)[inserts], np.array(gain)[inserts]
+        graph = MixerGraph(self.mixer, sorted(set(dest.tolist())), baked=self.baked)
+        return graph, graph.rows[dest], gain
+
+    def process(self, buses, energy=None, cost=None):
+        """Run every insert over ``buses`` (2 * self.buses, frames) in place; the master ends in rows 0:2.
+        Per-insert peaks go to ``energy`` and a smoothed cost in microseconds to ``cost``.
+        """
+        for i, row, chain, vol, tgt in self.steps:
+            t0 = time.perf_counter_ns()
+            bus = buses[2*row:2*row+2]
+            for fx in chain:
+                fx.process(bus)
+            if vol != 1.0: np.multiply(bus, vol, out=bus)
+            if energy is not None: energy[i] = max(bus.max(), -bus.min())
+            if tgt >= 0:
+                dst = buses[2*tgt:2*tgt+2]
+                np.add(dst, bus, out=dst)
+            if cost is not None: cost[i] += 0.1 * ((time.perf_counter_ns() - t0) / 1000 - cost[i])
+
 # ─── Audio Engine Logic ───────────────────────────────────────────────────────
 
-class Voice:
-    __slots__ = ['data', 'pos', 'vol', 'pan']
-    def __init__(self, data, vol=1.0, pan=0.5):
-        self.data = data
-        self.pos = 0
-        self.vol = vol
-        self.pan = pan
+class VoicePool:
+    """Fixed-capacity voice table stored as parallel arrays.
+
+    A slot is free when ``pos >= length``. Every block renders slots
+    ``[0:high)`` with one gather from the flat sample bank and one matmul
+    that applies the stereo gains and routes each voice to its mixer insert
+    bus, so the cost does not grow with Python work per voice. When the pool
+    is full the oldest voice is stolen.
+
+    All scratch is preallocated per block size and written through ``out=``.
+    Per-voice terms are spread over the block with small matmuls instead of
+    broadcasting, because a broadcast ufunc makes numpy allocate an iterator
+    buffer as large as the operands.
+    """
+    def __init__(self, capacity=MAX_VOICES):
+        self.capacity = capacity
+        self.sample = np.zeros(capacity, dtype=np.int32)   # sample id
+        self.chan = np.zeros(capacity, dtype=np.int32)     # channel
+        self.insert = np.zeros(capacity, dtype=np.int64)   # mixer insert
+        self.offset = np.zeros(capacity, dtype=np.int64)   # start in bank
+        self.length = np.zeros(capacity, dtype=np.int64)
+        self.pos = np.zeros(capacity, dtype=np.int64)
+        self.start = np.zeros(capacity, dtype=np.int64)    # in-block start offset
+        self.vol = np.zeros(capacity, dtype=np.float32)
+        self.lr = np.zeros((2, capacity), dtype=np.float32)  # L/R gains
+        self.gains = np.zeros((2 * MIXER_INSERTS, capacity), dtype=np.float32)  # L/R per bus row
+        self.rows = np.arange(MIXER_INSERTS, dtype=np.int64)  # insert -> bus row, -1 if inactive
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.free = np.zeros(capacity, dtype=bool)
+        self.coef = np.ones((capacity, 2), dtype=np.int64)  # [per-voice term, 1] @ [1; ramp]
+        self.high = 0
+        self.counter = 0
+        self.frames = 0
+
+    def set_routing(self, rows):
+        """Adopt a new insert -> bus row map; sounding voices are moved to their new rows."""
+        self.rows = rows
+        self.gains.fill(0)
+        idx = np.arange(self.high)
+        r = rows[self.insert[:self.high]]
+        live = r >= 0
+        self.gains[2 * r[live], idx[live]] = self.lr[0, idx[live]]
+        self.gains[2 * r[live] + 1, idx[live]] = self.lr[1, idx[live]]
+
+    def prepare(self, frames):
+        if frames == self.frames: return
+        self.frames = frames
+        self.ramp = np.stack([np.ones(frames, dtype=np.int64), np.arange(frames, dtype=np.int64)])
+        self.rel = np.empty((self.capacity, frames), dtype=np.int64)
+        self.outside = np.empty((self.capacity, frames), dtype=bool)
+        self.past = np.empty((self.capacity, frames), dtype=bool)
+        self.chunk = np.empty((self.capacity, frames), dtype=np.float32)
+
+    def clear(self):
+        self.pos[:] = 0
+        self.length[:] = 0
+        self.high = 0
+
+    def active_count(self):
+        return int(np.count_nonzero(self.pos[:self.high] < self.length[:self.high]))
+
+    def trigger(self, sample_id, chan, insert, offset, length, vol, pan, start=0):
+        free = self.free
+        np.greater_equal(self.pos, self.length, out=free)
+        if free.any():
+            slot = int(np.argmax(free))
+        else:
+            slot = int(np.argmin(self.age))  # steal the oldest voice
+        self.sample[slot] = sample_id
+        self.chan[slot] = chan
+        self.insert[slot] = insert
+        self.offset[slot] = offset
+        self.length[slot] = length
+        self.pos[slot] = 0
+        self.start[slot] = start
+        self.vol[slot] = vol
+        self.lr[0, slot] = vol * math.cos(pan * math.pi / 2)
+        self.lr[1, slot] = vol * math.sin(pan * math.pi / 2)
+        self.gains[:, slot] = 0
+        row = self.rows[insert]
+        if row >= 0:
+            self.gains[2 * row, slot] = self.lr[0, slot]
+            self.gains[2 * row + 1, slot] = self.lr[1, slot]
+        self.counter += 1
+        self.age[slot] = self.counter
+        self.high = max(self.high, slot + 1)
+
+    def render(self, bank, frames, buses):
+        """Mix slots [0:high) into the insert ``buses`` (2 * bus count, frames)."""
+        n = self.high
+        if n == 0: return
+        self.prepare(frames)
+        pos, start, length = self.pos[:n], self.start[:n], self.length[:n]
+        coef, term = self.coef[:n], self.coef[:n, 0]
+        rel, outside, past = self.rel[:n], self.outside[:n], self.past[:n]
+        chunk = self.chunk[:n]
+
+        # Read index per (voice, frame); anything outside the sample points at bank[0] (silence)
+        np.subtract(pos, start, out=term)                  # position within the sample
+        np.matmul(coef, self.ramp, out=rel)
+        np.less(rel, 0, out=outside)
+        np.subtract(term, length, out=term)                # ... relative to the sample end
+        np.matmul(coef, self.ramp, out=rel)
+        np.greater_equal(rel, 0, out=past)
+        np.logical_or(outside, past, out=outside)
+        np.add(term, length, out=term)
+        np.add(term, self.offset[:n], out=term)            # ... as a bank index
+        np.matmul(coef, self.ramp, out=rel)
+        np.copyto(rel, 0, where=outside)
+        np.take(bank, rel, out=chunk, mode='clip')  # 'raise' would buffer the output
+
+        np.matmul(self.gains[:len(buses), :n], chunk, out=buses)
+
+        # Advance
+        np.add(pos, frames, out=pos)
+        np.subtract(pos, start, out=pos)
+        start.fill(0)
+        alive = self.free[:n]
+        np.less(pos, length, out=alive)
+        self.high = n - int(np.argmax(alive[::-1])) if alive.any() else 0
+
+# One pass of a pattern rendered per mixer insert: audio rows (2 * len(inserts), length)
+PassRender = namedtuple('PassRender', 'audio inserts length')
+
+def render_pass(snap, p):
+    """Pattern ``p`` played once from a pass start, as its voices would play it:
+    every hit at its channel gains, summed per mixer insert, tails included.
+    """
+    times, chans, vels = snap.pat_times[p], snap.pat_chans[p], snap.pat_vels[p]
+    offs = np.floor(times).astype(np.int64)
+    lens = snap.sample_len[chans]
+    inserts = np.unique(snap.inserts[chans])
+    rows = np.searchsorted(inserts, snap.inserts[chans])
+    n = int((offs + lens).max()) if len(offs) else 0
+    audio = np.zeros((2 * len(inserts), n), dtype=np.float32)
+    pans = snap.pan[chans] * (math.pi / 2)
+    vol = snap.vol[chans] * vels
+    for o, c, r, m, v, a in zip(offs, chans, rows, lens, vol, pans):
+        src = snap.bank[snap.sample_off[c]:snap.sample_off[c] + m]
+        audio[2*r, o:o+m] += src * np.float32(v * math.cos(a))
+        audio[2*r+1, o:o+m] += src * np.float32(v * math.sin(a))
+    return PassRender(audio, tuple(inserts.tolist()), n)
+
+class PassStreams:
+    """Cached pattern passes playing in the callback, a fixed table like ``VoicePool``.
+
+    Slot s plays ``renders[s]`` from frame ``pos[s]`` (negative: it starts
+    that far into the next block); ``pattern`` and ``base`` (the pass start
+    on the timeline) identify the pass, so the sequencer skips its steps.
+    Each block adds a slice of every playing pass to its insert buses, one
+    add per insert and side, so a repeated pattern costs a copy instead of
+    a voice per hit.
+    """
+    def __init__(self, capacity=PASS_STREAMS):
+        self.renders = [None] * capacity
+        self.pattern = np.full(capacity, -1, dtype=np.int64)
+        self.base = np.zeros(capacity)
+        self.pos = np.zeros(capacity, dtype=np.int64)
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.counter = 0
+        self.high = 0
+
+    def clear(self):
+        for s in range(self.high):
+            self.renders[s] = None
+        self.pattern.fill(-1)
+        self.high = 0
+
+    def playing(self, pat, base):
+        for s in range(self.high):
+            if self.pattern[s] == pat and self.base[s] == base: return True
+        return False
+
+    def start(self, render, pat, base, offset):
+        for slot in range(len(self.renders)):
+            if self.renders[slot] is None: break
+        else:
+            slot = int(np.argmin(self.age))  # steal the oldest pass
+        self.renders[slot] = render
+        self.pattern[slot] = pat
+        self.base[slot] = base
+        self.pos[slot] = -offset
+        self.counter += 1
+        self.age[slot] = self.counter
+        self.high = max(self.high, slot + 1)
+
+    def render(self, buses, rows, frames):
+        """Add every playing pass into ``buses`` (2 * bus count, frames) and advance."""
+        for s in range(self.high):
+            r = self.renders[s]
+            if r is None: continue
+            pos = int(self.pos[s])
+            lo, hi = max(0, -pos), min(frames, r.length - pos)
+            if hi > lo:
+                for j, ins in enumerate(r.inserts):
+                    row = rows[ins]
+                    if row < 0: continue
+                    for k in range(2):  # row by row: a 2-D strided add buffers
+                        dst = buses[2*row+k, lo:hi]
+                        np.add(dst, r.audio[2*j+k, pos+lo:pos+hi], out=dst)
+            self.pos[s] = pos + frames
+            if pos + frames >= r.length:
+                self.renders[s] = None
+                self.pattern[s] = -1
+        while self.high and self.renders[self.high - 1] is None:
+            self.high -= 1
+
+class CommandRing:
+    """Single-producer/single-consumer command queue with preallocated slots.
+
+    The Tk thread only advances ``tail`` and the audio thread only advances
+    ``head``; each index is a single attribute store, so no lock is needed.
+    """
+    def __init__(self, size=CMD_QUEUE_SIZE):
+        self.slots = [None] * size
+        self.size = size
+        self.head = 0
+        self.tail = 0
+
+    def push(self, *cmd):
+        nxt = (self.tail + 1) % self.size
+        if nxt == self.head: return False  # full, drop
+        self.slots[self.tail] = cmd
+        self.tail = nxt
+        return True
+
+    def pop(self):
+        if self.head == self.tail: return None
+        cmd = self.slots[self.head]
+        self.slots[self.head] = None
+        self.head = (self.head + 1) % self.size
+        return cmd
+
+class AllocAudit:
+    """Debug switch: trace each callback after warm-up and fail on allocations.
+
+    The traced heap may not grow past its post-warm-up level, no GC-tracked
+    object may survive a block, and a block's transient peak must stay under
+    ``slack`` bytes. The slack covers the fixed bookkeeping numpy does per
+    ufunc call (iterators, reductions), which does not scale with the block;
+    any audio-sized temporary or a per-block leak exceeds it quickly.
+    """
+    def __init__(self, warmup=ALLOC_AUDIT_WARMUP, slack=ALLOC_AUDIT_SLACK, strict=True):
+        if not tracemalloc.is_tracing(): tracemalloc.start()
+        self.warmup = warmup
+        self.slack = slack
+        self.strict = strict       # raise on the first allocating block, else count them
+        self.failures = 0
+        self.blocks = 0
+        self.worst = 0
+        self.level = None
+
+    def run(self, fn, *args):
+        self.blocks += 1
+        if self.blocks <= self.warmup:
+            return fn(*args)
+        gc0 = gc.get_count()[0]
+        before = tracemalloc.get_traced_memory()[0]
+        if self.level is None: self.level = before
+        tracemalloc.reset_peak()
+        fn(*args)
+        after, peak = tracemalloc.get_traced_memory()
+        grown, transient, gc_new = after - self.level, peak - before, gc.get_count()[0] - gc0
+        self.worst = max(self.worst, transient)
+        if grown > self.slack or gc_new > 0 or transient > self.slack:
+            self.failures += 1
+            if not self.strict: return
+            raise AssertionError(f"callback allocated: block {self.blocks}, heap +{grown} B, "
+                                 f"transient {transient} B, {gc_new} GC-tracked objects")
+
+class LoadMeter:
+    """Per-block callback timing in a preallocated ring, for the DSP load display.
+
+    Each row is (frames, xrun flag, nanoseconds per ``LOAD_STAGES`` stage). The
+    audio thread stamps stage boundaries into ``marks``, fills the next row and
+    then advances ``count`` with a single attribute store, like ``CommandRing``,
+    so readers need no lock: they only read rows below ``count`` and never the
+    one about to be overwritten.
+    """
+    def __init__(self, size=LOAD_RING):
+        self.rows = np.zeros((size, 2 + len(LOAD_STAGES)), dtype=np.int64)
+        self.marks = np.zeros(len(LOAD_STAGES) + 1, dtype=np.int64)
+        self.size = size
+        self.count = 0
+        self.xruns = 0
+        self.pending = 0
+
+    def stamp(self, k):
+        self.marks[k] = time.perf_counter_ns()
+
+    def xrun(self):
+        # Called from the callback on an underflow/overflow; flagged on the next row
+        self.xruns += 1
+        self.pending = 1
+
+    def commit(self, frames):
+        row = self.rows[self.count % self.size]
+        row[0] = frames
+        row[1] = self.pending
+        np.subtract(self.marks[1:], self.marks[:-1], out=row[2:])
+        self.pending = 0
+        self.count += 1
+
+    def recent(self, n=None):
+        """Copy of the last ``n`` recorded blocks (default: all kept), oldest first."""
+        return self._recent(n)[1]
+
+    def _recent(self, n):
+        count = self.count
+        n = min(self.size - 1 if n is None else n, count, self.size - 1)
+        return count - n, self.rows[np.arange(count - n, count) % self.size]
+
+    def load(self, n=32):
+        """Mean and peak callback time over the last ``n`` blocks, as fractions of the block deadline."""
+        rows = self.recent(n)
+        if not len(rows): return 0.0, 0.0
+        busy = rows[:, 2:].sum(axis=1) / (rows[:, 0] * (1e9 / SAMPLE_RATE))
+        return float(busy.mean()), float(busy.max())
+
+    def dump_csv(self, path):
+        """Write the kept blocks to ``path``, one row per block, times in microseconds."""
+        first, rows = self._recent(None)
+        deadline = rows[:, 0] * (1e6 / SAMPLE_RATE)
+        stages = rows[:, 2:] / 1000
+        total = stages.sum(axis=1)
+        table = np.column_stack([np.arange(first, first + len(rows)), rows[:, :2],
+                                 deadline, stages, total, 100 * total / np.maximum(deadline, 1e-9)])
+        header = ','.join(['block', 'frames', 'xrun', 'deadline_us'] + [f'{s}_us' for s in LOAD_STAGES] + ['total_us', 'load_pct'])
+        np.savetxt(path, table, delimiter=',', header=header, comments='',
+                   fmt=['%d', '%d', '%d'] + ['%.1f'] * (len(LOAD_STAGES) + 3))
+
+class MasterTap:
+    """The last ``size`` frames of the master output, summed to mono, for the scope and spectrum.
+
+    The callback writes each block at ``written`` (wrapping) and then
+    advances it with one store; the UI thread copies the frames behind it.
+    Reading at most half the ring keeps clear of the block being written.
+    """
+    def __init__(self, size=SCOPE_RING):
+        self.buf = np.zeros(size, dtype=np.float32)
+        self.size = size
+        self.written = 0
+
+    def push(self, mix):
+        n = mix.shape[1]
+        w = self.written % self.size
+        a = min(n, self.size - w)
+        np.add(mix[0, :a], mix[1, :a], out=self.buf[w:w+a])
+        if a < n: np.add(mix[0, a:], mix[1, a:], out=self.buf[:n-a])
+        self.written += n
+
+    def latest(self, n):
+        """Copy of the newest ``n`` frames (at most half the ring) as mono, oldest first."""
+        end = self.written
+        return self.buf[np.arange(end - n, end) % self.size] * 0.5
+
+def scope_points(x, width, height):
+    """Min/max envelope of ``x`` as one flat polyline, a max and a min point per pixel column."""
+    k = max(1, len(x) // width)
+    cols = x[:len(x) // k * k].reshape(-1, k)
+    pts = np.empty((len(cols), 2, 2))
+    pts[:, :, 0] = (np.arange(len(cols)) * (width / len(cols)))[:, None]
+    pts[:, 0, 1] = cols.max(axis=1)
+    pts[:, 1, 1] = cols.min(axis=1)
+    pts[:, :, 1] = height / 2 * (1 - np.clip(pts[:, :, 1], -1, 1))
+    return pts.ravel().tolist()
+
+@functools.lru_cache(maxsize=None)
+def _spectrum_plan(n, bins):
+    window = np.hanning(n).astype(np.float32)
+    edges = np.geomspace(30, 20000, bins + 1)[:-1] * n / SAMPLE_RATE
+    return window, 2 / window.sum(), np.minimum(np.round(edges).astype(np.int64), n // 2)
+
+def spectrum_db(x, bins=SPECTRUM_BINS):
+    """Peak level in dBFS of each log-spaced band of ``x``'s Hann-windowed spectrum."""
+    window, norm, starts = _spectrum_plan(len(x), bins)
+    mag = np.abs(np.fft.rfft(x * window)) * norm
+    # Low bands narrower than one FFT bin repeat a start and read that bin alone
+    return 20 * np.log10(np.maximum.reduceat(mag, starts) + 1e-9)
+
+class ClipIndex:
+    """Stabbing index over arrangement clips, times in bars.
+
+    Clip boundaries cut the timeline into elementary segments. Each segment
+    lists the clips covering it as CSR arrays (``ptr``, ``ids``). The clips
+    under a block are one searchsorted plus the few segments the block spans,
+    i.e. O(log n + k) for n clips, k of them sounding.
+    """
+    def __init__(self, starts, lengths, patterns):
+        self.start = np.asarray(starts, dtype=np.float64)
+        self.end = self.start + np.asarray(lengths, dtype=np.float64)
+        self.pattern = np.asarray(patterns, dtype=np.int64)
+        self.length = float(self.end.max()) if len(self.end) else 0.0  # song length in bars
+        self.bounds = np.unique(np.concatenate([self.start, self.end]))
+        s0 = np.searchsorted(self.bounds, self.start)
+        spans = np.searchsorted(self.bounds, self.end) - s0
+        clip = np.repeat(np.arange(len(spans)), spans)
+        seg = np.repeat(s0 - np.cumsum(spans) + spans, spans) + np.arange(int(spans.sum()))
+        order = np.argsort(seg, kind='stable')
+        self.ids = clip[order]
+        self.ptr = np.searchsorted(seg[order], np.arange(len(self.bounds)))
+
+    def query(self, lo, hi):
+        """Yield each clip overlapping [lo, hi) bars once."""
+        bounds, ptr, ids, start = self.bounds, self.ptr, self.ids, self.start
+        j0 = max(0, int(np.searchsorted(bounds, lo, 'right')) - 1)
+        j1 = int(np.searchsorted(bounds, hi, 'left'))
+        for j in range(j0, min(j1, len(bounds) - 1)):
+            for c in ids[ptr[j]:ptr[j+1]]:
+                # A clip spans consecutive segments: report it where it starts or in the first one
+                if j == j0 or start[c] == bounds[j]:
+                    yield c
+
+def step_chance(base, event):
+    """Uniform [0, 1) roll for step key ``event`` (channel * steps + step) in a pattern pass starting at sample ``base``.
+
+    A counter hash instead of a random generator: works on Python ints in the
+    callback and on uint64 arrays offline, and both roll the same dice, so
+    probability steps render identically live and in an export.
+    """
+    h = (base * 0x9E3779B97F4A7C15 + event * 0xD1B54A32D192ED03) & 0xFFFFFFFFFFFFFFFF
+    h ^= h >> 32
+    h = (h * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    h ^= h >> 29
+    return (h >> 11) * 2.0 ** -53
+
+# ─── Audio Backends ───────────────────────────────────────────────────────────
+
+class SoundDeviceBackend:
+    """The audio device: PortAudio calls the engine on its own thread."""
+    def __init__(self, callback, blocksize=BLOCK_SIZE):
+        self.callback = callback
+        self.blocksize = blocksize
+        self.stream = None
+
+    def start(self):
+        self.stream = sd.OutputStream(channels=2, callback=self.callback, samplerate=SAMPLE_RATE, blocksize=self.blocksize)
+        self.stream.start()
+
+    def stop(self):
+        self.stream.stop()
+        self.stream.close()
+
+class NullBackend:
+    """No device: calls the engine block by block against a virtual clock.
+
+    ``speed`` None runs as fast as the callback allows (soak tests push hours
+    through in minutes); 1.0 paces the clock to the wall clock. ``start``
+    drives from a thread like a device would, ``run`` drives a fixed number
+    of frames on the caller's thread.
+    """
+    def __init__(self, callback, blocksize=BLOCK_SIZE, speed=None):
+        self.callback = callback
+        self.blocksize = blocksize
+        self.speed = speed
+        self.frames = 0            # the virtual clock
+        self.out = np.zeros((blocksize, 2), dtype=np.float32)
+        self._halt = threading.Event()
+        self._thread = None
+
+    @property
+    def time(self):
+        return self.frames / SAMPLE_RATE
+
+    def deliver(self, out):
+        """Where a block goes once rendered; the null backend drops it."""
+
+    def run(self, frames):
+        """Drive ``frames`` (rounded up to whole blocks) now; returns the frames played."""
+        end = self.frames + frames
+        t0, f0 = time.perf_counter(), self.frames
+        while self.frames < end and not self._halt.is_set():
+            self.callback(self.out, self.blocksize, None, None)
+            self.deliver(self.out)
+            self.frames += self.blocksize
+            if self.speed:
+                ahead = (self.frames - f0) / (SAMPLE_RATE * self.speed) - (time.perf_counter() - t0)
+                if ahead > 0: time.sleep(ahead)
+        return self.frames - f0
+
+    def start(self):
+        self._halt.clear()
+        self._thread = threading.Thread(target=self.run, args=(float('inf'),), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._halt.set()
+        if self._thread: self._thread.join()
+
+class FileBackend(NullBackend):
+    """Null backend that writes every block to a WAV file, i.e. the live mix as heard."""
+    def __init__(self, callback, path, fmt='float32', blocksize=BLOCK_SIZE, speed=None):
+        super().__init__(callback, blocksize, speed)
+        self.writer = WavWriter(path, fmt)
+
+    def deliver(self, out):
+        self.writer.write(out)
+
+    def stop(self):
+        super().stop()
+        self.writer.close()
+
+AUDIO_BACKENDS = {'sounddevice': SoundDeviceBackend, 'null': NullBackend, 'file': FileBackend}
+AUDIO_BACKEND = os.environ.get('CAT26_AUDIO', 'sounddevice')  # backend the studio opens
+
+# Immutable state the audio thread plays from; replaced wholesale by publish().
+# loop_len is one bar (16 steps), the playlist's unit; pattern p loops every pat_steps[p] steps.
+# Channels past the rack's play frozen buffers (see freeze_channel); owner maps them to their rack channel.
+# passes[p] is pattern p's cached PassRender, or None while it plays by voices.
+ProjectSnapshot = namedtuple('ProjectSnapshot', 'bpm sps loop_len pattern pat_times pat_chans pat_vels pat_probs pat_keys '
+                                                'pat_steps song_mode song bank sample_off sample_len vol pan inserts owner '
+                                                'passes mixer')
 
 class AudioEngine:
     def __init__(self):
         self.bpm = 140
-        self.playing = False
+        self.playing = False       # audio-thread state, written by the callback
+        self.transport = False     # UI intent, sent through the command ring
         self.song_mode = False # False=Pat, True=Song
         self.recording = False
         self.sample_pos = 0
-        self.stream = None
-        self.channels = [] 
-        self.voices = []
-        self.meter_levels = [0.0] * 10
+        self.backend = None
+        self.channels = []         # UI-owned project state
+        self.patterns = []         # {'name', + PATTERN_LAYERS: (channels x steps) arrays}
+        self.pattern = 0           # pattern shown in the rack; channel['steps'] aliases its gate rows
+        self.clips = []            # {'pattern', 'start', 'length', 'track'}, in bars
+        self.song = ClipIndex([], [], [])
+        self.mixer = [{'name': 'Master' if i == 0 else f'Insert {i}', 'vol': 1.0,
+                       'target': None if i == 0 else 0, 'fx': [None] * FX_SLOTS}
+                      for i in range(MIXER_INSERTS)]
+        self.voices = VoicePool(MAX_VOICES)
+        self.streams = PassStreams()
+        self.commands = CommandRing()
+        self.meter_levels = np.zeros(MIXER_INSERTS, dtype=np.float32)  # per insert, master at 0
+        self.insert_cost = np.zeros(MIXER_INSERTS)  # smoothed microseconds per block
+        self.load = LoadMeter()
+        self.tap = MasterTap()
         self.current_step = 0
+        self.snapshot = None
+        self.kit_loader = None
+        self._publish_lock = threading.Lock()  # UI and loader threads only, never the callback
+        self._pat_cache = {}       # id(gate) -> (gate, sps, layout, compiled events); edits drop their entry
+        self.frozen = {}           # channel -> freeze record (see freeze_channel); not saved with the project
+        self._layout = None        # frozen buffers as extra snapshot channels, rebuilt when freezes change
+        self._samples = None       # bank and rack channel spans of the last build_bank
+        self._bank_gen = 0         # bumped per build_bank; part of every pass key
+        self.pass_cache = LRUCache(PASS_CACHE_BYTES)
+        self.sample_cache = LRUCache(SAMPLE_CACHE_BYTES)  # decoded sample files (UI thread)
+        self._pass_keys = {}       # id(events) -> (events, params, key, bytes)
+        self._pass_todo = {}       # key -> (snapshot, pattern) still to render
+        self.pass_loader = None
+        self._bank = None
+        self.graph = None          # compiled mixer, rebuilt on routing/FX changes
+        self._graph = None
+        self._buses = np.zeros((2, 0), dtype=np.float32)
+        self._energy = np.zeros(MIXER_INSERTS, dtype=np.float32)
+        self.audit = AllocAudit() if ALLOC_AUDIT else None
+        self.build_bank()
         
-    def load_kit(self):
-        # Create standard "Trap/HipHop" kit
+    def load_kit(self, seed=KIT_SEED, background=True):
+        """Create the standard "Trap/HipHop" kit.
+        ``seed=None`` gives a fresh random, uncached kit.
+        """
+        recipes = [
+            ('synth_kick',  {}),
+            ('synth_clap',  {}),
+            ('synth_hat',   {'duration': 0.08}),
+            ('synth_hat',   {'duration': 0.4, 'open_hat': True}),
+            ('synth_snare', {}),
+        ]
+        self.frozen = {}
         self.channels = [
-            {'name': 'Kick',      'data': synth_kick(),          'color': '#2962FF', 'steps': [1,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'vol': 0.9, 'pan': 0.5},
-            {'name': 'Clap',      'data': synth_clap(),          'color': '#455A64', 'steps': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'vol': 0.8, 'pan': 0.5},
-            {'name': 'Hat (C)',   'data': synth_hat(0.08),       'color': '#00B0FF', 'steps': [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1], 'vol': 0.6, 'pan': 0.4},
-            {'name': 'Hat (O)',   'data': synth_hat(0.4, True),  'color': '#80D8FF', 'steps': [0,0,1,0,0,0,1,0,0,0,1,0,0,0,1,0], 'vol': 0.6, 'pan': 0.6},
-            {'name': 'Snare',     'data': synth_snare(),         'color': '#00E5FF', 'steps': [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1], 'vol': 0.8, 'pan': 0.5},
+            {'name': 'Kick',      'color': '#2962FF', 'steps': [1,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'vol': 0.9, 'pan': 0.5},
+            {'name': 'Clap',      'color': '#455A64', 'steps': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'vol': 0.8, 'pan': 0.5},
+            {'name': 'Hat (C)',   'color': '#00B0FF', 'steps': [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1], 'vol': 0.6, 'pan': 0.4},
+            {'name': 'Hat (O)',   'color': '#80D8FF', 'steps': [0,0,1,0,0,0,1,0,0,0,1,0,0,0,1,0], 'vol': 0.6, 'pan': 0.6},
+            {'name': 'Snare',     'color': '#00E5FF', 'steps': [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1], 'vol': 0.8, 'pan': 0.5},
+        ]
+        for i, (ch, (fn, params)) in enumerate(zip(self.channels, recipes)):
+            ch['insert'] = i + 1
+            ch['source'] = {'synth': fn, 'params': params, 'seed': None if seed is None else seed + i}
+            self.mixer[i + 1]['name'] = ch['name']
+        self.patterns = [
+            self.make_pattern('Pattern 1', [ch['steps'] for ch in self.channels]),
+            self.make_pattern('Pattern 2', [
+                [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0],
+                [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0],
+                [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0],
+                [0,0,0,0,0,0,1,0,0,0,0,0,0,0,1,0],
+                [0,0,0,0,0,0,0,0,0,0,0,0,1,1,1,1],
+            ]),
         ]
-        self.meter_levels = [0.0] * (len(self.channels) + 1) # +1 for Master
+        self._show_pattern(0)
+        self.clips = [
+            {'pattern': 0, 'start': 0, 'length': 4, 'track': 0},
+            {'pattern': 1, 'start': 4, 'length': 4, 'track': 1},
+        ]
+        self._index_clips()
+        self._load_sources(background)
+
+    def _load_sources(self, background=True):
+        """Fill every channel's ``data`` from its ``source`` recipe and publish.
+
+        Cached samples load memory-mapped at once. Misses start as silence and
+        are synthesized by a background thread, which republishes the bank
+        when done (or inline with ``background=False``); a channel whose
+        source changes meanwhile keeps its new sample. Sample files load
+        through ``read_sample``; one that is gone or unreadable plays silence.
+        """
+        misses = []
+        for ch in self.channels:
+            src = ch['source']
+            if 'file' in src:
+                try:
+                    ch['data'] = self.read_sample(src['file'])
+                except (OSError, ValueError):
+                    ch['data'] = np.zeros(1, dtype=np.float32)
+                continue
+            ch['data'] = load_cached(SYNTHS[src['synth']], src['seed'], **src['params'])
+            if ch['data'] is None:
+                ch['data'] = np.zeros(1, dtype=np.float32)
+                misses.append(ch)
+        self.build_bank()
+
+        def fill():
+            for ch in misses:
+                src = ch['source']
+                data = synth_cached(SYNTHS[src['synth']], src['seed'], **src['params'])
+                with self._publish_lock:
+                    # A channel given a file (or a new recipe) meanwhile keeps it
+                    if ch['source'] is src: ch['data'] = data
+            self.build_bank()
+        if misses and background:
+            self.kit_loader = threading.Thread(target=fill, name="kit-synth", daemon=True)
+            self.kit_loader.start()
+        elif misses:
+            fill()
+
+    def read_sample(self, path):
+        """A sample file decoded by ``read_wav``, through the engine's LRU cache.
+
+        Keyed by the file's real path, size and modification time, so
+        channels loading the same file get the same (read-only) buffer, and
+        ``build_bank`` gives them one span of the bank. Eviction only drops
+        the cache's reference; channels keep playing their buffers.
+        """
+        st = os.stat(path)
+        key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        data = self.sample_cache.get(key)
+        if data is None:
+            data = read_wav(path)
+            data.flags.writeable = False
+            self.sample_cache.put(key, data, data.nbytes)
+        return data
+
+    def load_sample(self, ch_idx, path):
+        """Load a WAV file into a channel, which takes the file's name; raises OSError or ValueError."""
+        data = self.read_sample(path)
+        with self._publish_lock:
+            self.channels[ch_idx].update(data=data, source={'file': os.path.abspath(path)},
+                                         name=os.path.splitext(os.path.basename(path))[0])
+            self._build_bank()
+
+    # ─── Project Files ────────────────────────────────────────────────────────
+
+    CHANNEL_KEYS = ('name', 'color', 'vol', 'pan', 'insert', 'source')
+
+    def to_project(self):
+        """The project as a JSON-ready dict; samples are stored as their source recipes."""
+        return {
+            'format': 'catstudio26', 'version': PROJECT_VERSION,
+            'bpm': self.bpm, 'song_mode': self.song_mode, 'pattern': self.pattern,
+            'channels': [{k: ch[k] for k in self.CHANNEL_KEYS} for ch in self.channels],
+            'patterns': [dict(name=pat['name'], **{k: pat[k].tolist() for k in PATTERN_LAYERS}) for pat in self.patterns],
+            'clips': self.clips,
+            'mixer': self.mixer,
+        }
+
+    def from_project(self, proj, background=True, bank=None):
+        """Load a ``to_project`` dict. With ``bank`` (a project file's sample section)
+        channels play their embedded ``sample`` spans from it; otherwise samples
+        are rebuilt from their source recipes.
+
+        The whole project is parsed and checked before the engine changes, then
+        swapped in at once: a malformed one raises ValueError (or the KeyError,
+        IndexError or TypeError of a missing or mistyped field) and leaves the
+        engine as it was.
+        """
+        if proj.get('format') != 'catstudio26' or proj.get('version', 0) > PROJECT_VERSION:
+            raise ValueError("not a Cat's Studio 26 project (or from a newer version)")
+        if bank is not None:
+            spans = np.array([ch['sample'] for ch in proj['channels']], dtype=np.int64).reshape(-1, 2)
+            if len(spans) and (spans[:, 0].min() < 1 or (spans[:, 0] + spans[:, 1]).max() > len(bank)):
+                raise ValueError("project sample section is truncated")
+        bpm = proj['bpm']
+        if not bpm > 0: raise ValueError(f"project tempo {proj['bpm']} is not positive")
+        channels = [{k: ch[k] for k in self.CHANNEL_KEYS} for ch in proj['channels']]
+        mixer = [dict(m, fx=list(m['fx'])) for m in proj['mixer']]
+        for ch in channels:
+            if not 0 <= ch['insert'] < len(mixer):
+                raise ValueError(f"channel {ch['name']!r} is routed to missing insert {ch['insert']}")
+            if 'file' not in ch['source'] and ch['source']['synth'] not in SYNTHS:
+                raise ValueError(f"channel {ch['name']!r} has unknown synth {ch['source']['synth']!r}")
+        MixerGraph(mixer, sorted({ch['insert'] for ch in channels}))  # targets and effect specs must compile
+        patterns = []
+        for pat in proj['patterns']:
+            if 'steps' in pat:  # versions 1-2: one list per channel, 0 = off, else the velocity
+                steps = np.array(pat['steps'], dtype=np.float32).reshape(len(channels), -1)
+                pat = {'name': pat['name'], 'gate': steps != 0, 'vel': np.where(steps != 0, steps, 1)}
+            pat = self.make_pattern(pat['name'], pat['gate'], rows=len(channels), **{k: pat[k] for k in ('vel', 'prob', 'shift') if k in pat})
+            if len(pat['gate']) != len(channels):
+                raise ValueError(f"pattern {pat['name']!r} has {len(pat['gate'])} rows for {len(channels)} channels")
+            patterns.append(pat)
+        if not 0 <= proj['pattern'] < len(patterns): raise ValueError(f"no pattern {proj['pattern']} to show")
+        clips = proj['clips']
+        song = ClipIndex([c['start'] for c in clips], [c['length'] for c in clips], [c['pattern'] for c in clips])
+        if len(song.pattern) and not 0 <= song.pattern.min() <= song.pattern.max() < len(patterns):
+            raise ValueError("a clip plays a missing pattern")
+        for ch, span in zip(channels, spans if bank is not None else [None] * len(channels)):
+            ch['data'] = np.zeros(1, dtype=np.float32) if span is None else bank[span[0]:span[0] + span[1]]
+
+        with self._publish_lock:
+            self.bpm, self.song_mode, self.frozen = bpm, proj['song_mode'], {}
+            self.channels, self.patterns, self.mixer = channels, patterns, mixer
+            self.clips, self.song = clips, song
+            self._show_pattern(proj['pattern'])
+            if bank is not None: self._build_bank(mapped=(bank, spans[:, 0], spans[:, 1]))
+        if bank is None: self._load_sources(background)
+
+    def save_project(self, path):
+        """Write the project: a struct + JSON header, then the sample bank as raw float32.
+
+        The sample section is the bank exactly as the engine plays it (silent
+        guard included), so ``load_project`` maps it rather than reading it.
+        The file is written next to ``path`` and renamed over it; saving over
+        the project the samples are mapped from first moves them into memory
+        (see ``_unmap``).
+        """
+        if self.kit_loader and self.kit_loader.is_alive():
+            self.kit_loader.join()  # save the synthesized kit, not its silent placeholders
+        with self._publish_lock:
+            snap = self.snapshot
+            proj = self.to_project()
+        for ch, o, n in zip(proj['channels'], snap.sample_off, snap.sample_len):
+            ch['sample'] = [int(o), int(n)]
+        rack = len(proj['channels'])
+        end = int(np.max(snap.sample_off[:rack] + snap.sample_len[:rack])) if rack else 1  # frozen buffers stay behind
+        meta = json.dumps(proj, indent=1).encode()
+        start = -(-(PROJECT_HEADER.size + len(meta)) // PROJECT_ALIGN) * PROJECT_ALIGN
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(PROJECT_HEADER.pack(PROJECT_MAGIC, len(meta), start, end))
+                f.write(meta)
+                f.write(bytes(start - f.tell()))
+                snap.bank[:end].astype('<f4', copy=False).tofile(f)
+            del snap
+            self._unmap(path)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+
+    def _unmap(self, path):
+        # Give channels that play spans of ``path``'s mapped sample section their own
+        # copies and rebuild the bank, so no mapping of the file is left open (Windows
+        # cannot replace a mapped file). A frozen channel keeps its buffers: same audio.
+        path = os.path.normcase(os.path.abspath(path))
+        with self._publish_lock:
+            copies = {}
+            for c, ch in enumerate(self.channels):
+                base = ch['data']
+                while base is not None and not isinstance(base, np.memmap):
+                    base = base.base
+                if base is None or os.path.normcase(base.filename) != path: continue
+                key = (ch['data'].__array_interface__['data'][0], len(ch['data']))
+                if key not in copies: copies[key] = np.array(ch['data'])
+                ch['data'] = copies[key]
+                fr = self.frozen.get(c)
+                if fr is not None:
+                    fr['data'], fr['sig'] = ch['data'], (id(ch['data']),) + fr['sig'][1:]
+            if copies: self._build_bank()
+
+    def load_project(self, path, background=True):
+        """Open a project file. The sample section is memory-mapped, so opening
+        costs the JSON header only; pages load as voices first touch them.
+        """
+        with open(path, 'rb') as f:
+            head = f.read(PROJECT_HEADER.size)
+            if not head.startswith(PROJECT_MAGIC):  # version 1: plain JSON
+                f.seek(0)
+                return self.from_project(json.loads(f.read()), background)
+            _, meta_len, start, count = PROJECT_HEADER.unpack(head)
+            proj = json.loads(f.read(meta_len))
+        if os.path.getsize(path) < start + 4 * count:
+            raise ValueError("project sample section is truncated")
+        # A plain ndarray view keeps the callback's np.take on the ndarray fast path
+        bank = np.memmap(path, dtype='<f4', mode='r', offset=start, shape=(count,)).view(np.ndarray)
+        self.from_project(proj, background, bank=bank)
+
+    def song_bars(self):
+        """Bars an export covers by default: the arrangement in SONG mode, else four pattern loops."""
+        if self.song_mode and self.song.length: return self.song.length
+        return 4 * self.patterns[self.pattern]['gate'].shape[1] / 16 if self.patterns else 4
+
+    # ─── Project State (UI thread) ────────────────────────────────────────────
+
+    def build_bank(self, mapped=None):
+        # One flat float32 bank for all channel samples; index 0 is a silent guard sample.
+        # ``mapped`` is an already laid out (bank, offsets, lengths), published without a copy.
+        with self._publish_lock:
+            self._build_bank(mapped)
+
+    def _build_bank(self, mapped=None):
+        # Frozen buffers follow the channel samples, left then right
+        if mapped is not None:
+            bank, offs, lens = mapped
+        else:
+            # Channels playing the same buffer (one sample file) share its span
+            lens = np.array([len(ch['data']) for ch in self.channels], dtype=np.int64)
+            offs, spans, pos = np.zeros(len(lens), dtype=np.int64), {}, 1
+            for i, ch in enumerate(self.channels):
+                key = (ch['data'].__array_interface__['data'][0], len(ch['data']))
+                if key not in spans:
+                    spans[key] = pos
+                    pos += len(ch['data'])
+                offs[i] = spans[key]
+            frozen = sum(2 * a.shape[1] for fr in self.frozen.values() for a in fr['audio'].values())
+            bank = np.zeros(pos + frozen, dtype=np.float32)
+            for ch, o, n in zip(self.channels, offs, lens):
+                bank[o:o+n] = ch['data']
+            for fr in self.frozen.values():
+                for key, a in fr['audio'].items():
+                    fr['off'][key] = pos
+                    bank[pos:pos + a.size] = a.ravel()
+                    pos += a.size
+        self._layout = None
+        self._bank_gen += 1
+        self._compile_mixer()
+        self._publish(dict(bank=bank, sample_off=offs, sample_len=lens))
+
+    def publish(self, **samples):
+        """Compile the project into a new ProjectSnapshot and swap it in.
+
+        Each pattern becomes sorted event arrays (loop-relative time, channel,
+        velocity). Sample bank fields are carried over unless given.
+        """
+        with self._publish_lock:
+            self._publish(samples)
+
+    def _compile_mixer(self):
+        used = sorted({ch['insert'] for ch in self.channels})
+        baked = [self.channels[c]['insert'] for c, fr in self.frozen.items() if fr['baked']]
+        self.graph = MixerGraph(self.mixer, used, self.graph, baked)
+
+    def _compile_pattern(self, p, pat, sps, layout=None):
+        # Sorted events of one pattern: time from the loop start (micro-offsets wrap
+        # around the loop), channel, velocity, probability and step key. With a
+        # freeze ``layout``, frozen channels' steps give way to one event per bar
+        # for each side of their frozen buffer.
+        gate = pat['gate']
+        hit = self._pat_cache.get(id(gate))
+        if hit is not None and hit[0] is gate and hit[1] == sps and hit[2] is layout:
+            return hit[3]
+        chans, idx = np.nonzero(gate)
+        times = ((idx + pat['shift'][chans, idx].astype(np.float64)) % gate.shape[1]) * sps
+        vels, probs = pat['vel'][chans, idx].astype(np.float32), pat['prob'][chans, idx].astype(np.float64)
+        keys = chans * gate.shape[1] + idx
+        if layout is not None:
+            live = ~np.isin(chans, layout['channels'])
+            bars, pseudo = layout['events'].get(p, ((), ()))
+            n = len(pseudo)
+            times = np.concatenate([times[live], np.floor(np.asarray(bars, dtype=np.float64) * (16 * sps))])
+            chans = np.concatenate([chans[live], np.asarray(pseudo, dtype=np.int64)])
+            vels = np.concatenate([vels[live], np.ones(n, dtype=np.float32)])
+            probs = np.concatenate([probs[live], np.ones(n)])
+            keys = np.concatenate([keys[live], np.zeros(n, dtype=np.int64)])
+        order = np.lexsort((chans, times))
+        events = (times[order], chans[order].astype(np.int32), vels[order], probs[order], keys[order], gate.shape[1])
+        self._pat_cache[id(gate)] = (gate, sps, layout, events)
+        return events
+
+    def _publish(self, samples):
+        if samples: self._samples = samples
+        self._thaw_stale()
+        if self.frozen and self._layout is None: self._layout = self._freeze_layout()
+        layout = self._layout if self.frozen else None
+        sps = (60 / self.bpm / 4) * SAMPLE_RATE
+        patterns = self.patterns or [self.make_pattern('', np.zeros((len(self.channels), 16)))]
+        live = {id(pat['gate']) for pat in patterns}
+        for key in [k for k in self._pat_cache if k not in live]:
+            del self._pat_cache[key]
+        times, chans, vels, probs, keys, steps = zip(*(self._compile_pattern(p, pat, sps, layout) for p, pat in enumerate(patterns)))
+        rack = len(self.channels)
+        frozen = layout or {'owner': [], 'off': [], 'len': [], 'pan': []}
+        owner = np.concatenate([np.arange(rack), frozen['owner']]).astype(np.int64)
+        self.snapshot = ProjectSnapshot(
+            bpm=self.bpm, sps=sps, loop_len=16 * sps, pattern=min(self.pattern, len(times) - 1),
+            pat_times=times, pat_chans=chans, pat_vels=vels, pat_probs=probs, pat_keys=keys,
+            pat_steps=np.array(steps, dtype=np.int64), song_mode=self.song_mode, song=self.song,
+            bank=self._samples['bank'],
+            sample_off=np.concatenate([self._samples['sample_off'], frozen['off']]).astype(np.int64),
+            sample_len=np.concatenate([self._samples['sample_len'], frozen['len']]).astype(np.int64),
+            vol=np.array([ch['vol'] for ch in self.channels] + [1.0] * (len(owner) - rack), dtype=np.float32),
+            pan=np.array([ch['pan'] for ch in self.channels] + list(frozen['pan']), dtype=np.float32),
+            inserts=np.array([ch['insert'] for ch in self.channels], dtype=np.int64)[owner],
+            owner=owner, passes=(None,) * len(times), mixer=self.graph)
+        self.snapshot = self._cached_passes(self.snapshot)
+
+    def _cached_passes(self, snap):
+        # Patterns worth a pass render: those in the song (most repeated first) or the
+        # looping pattern, without probability steps, while the renders fit the cache.
+        # Cached ones go into the snapshot; the rest are queued for the pass loader.
+        if snap.song_mode:
+            reps = np.bincount(snap.song.pattern, weights=snap.song.end - snap.song.start, minlength=len(snap.passes))
+            want = [int(p) for p in np.argsort(-reps, kind='stable') if reps[p] > 0]
+        else:
+            want = [snap.pattern]
+        params = (self._bank_gen, snap.vol.tobytes(), snap.pan.tobytes(), snap.inserts.tobytes())
+        live, passes, todo, budget = {}, list(snap.passes), {}, self.pass_cache.limit
+        for p in want:
+            if len(snap.pat_probs[p]) == 0 or snap.pat_probs[p].min() < 1: continue
+            events = (snap.pat_times[p], snap.pat_chans[p], snap.pat_vels[p])
+            memo = self._pass_keys.get(id(events[0]))
+            if memo is None or memo[0] is not events[0] or memo[1] != params:
+                chans = events[1]
+                h = hashlib.blake2b(digest_size=16)
+                for a in (*events, snap.vol[chans], snap.pan[chans], snap.inserts[chans],
+                          snap.sample_off[chans], snap.sample_len[chans], np.int64(self._bank_gen)):
+                    h.update(np.ascontiguousarray(a).tobytes())
+                size = 8 * len(np.unique(snap.inserts[chans])) * int(np.max(np.floor(events[0]) + snap.sample_len[chans]))
+                memo = (events[0], params, h.digest(), size)
+            live[id(events[0])] = memo
+            if memo[3] > budget: continue
+            budget -= memo[3]
+            passes[p] = self.pass_cache.get(memo[2])
+            if passes[p] is None: todo[memo[2]] = (snap, p)
+        self._pass_keys = live
+        self._pass_todo = todo
+        if todo and self.backend is not None and self.pass_loader is None:
+            self.pass_loader = threading.Thread(target=self._pass_worker, name="pass-render", daemon=True)
+            self.pass_loader.start()
+        return snap._replace(passes=tuple(passes))
+
+    def _pass_worker(self):
+        # Render queued passes off the lock, cache them and republish until nothing is left
+        while True:
+            with self._publish_lock:
+                todo, self._pass_todo = self._pass_todo, {}
+                if not todo:
+                    self.pass_loader = None
+                    return
+            done = [(key, render_pass(snap, p)) for key, (snap, p) in todo.items()]
+            with self._publish_lock:
+                for key, render in done:
+                    self.pass_cache.put(key, render, render.audio.nbytes)
+                self._publish({})
+
+    def render_passes(self):
+        """Render every pass the snapshot wants on this thread (exports, headless playback)."""
+        with self._publish_lock:
+            todo, self._pass_todo = self._pass_todo, {}
+            for key, (snap, p) in todo.items():
+                render = render_pass(snap, p)
+                self.pass_cache.put(key, render, render.audio.nbytes)
+            self._publish({})
+
+    def make_pattern(self, name, gate, rows=None, **layers):
+        """A pattern from its (channels x steps) gate; the 'vel', 'prob' and 'shift'
+        layers default to full velocity, always, on the grid. ``rows`` is the
+        channel count (default: the rack's).
+        """
+        rows = len(self.channels) if rows is None else rows
+        gate = np.array(gate, dtype=np.uint8)
+        if gate.ndim != 2:  # nested lists of a project without channels flatten to 1-D
+            gate = gate.reshape(rows, -1) if rows else np.zeros((0, 16), dtype=np.uint8)
+        pat = {'name': name, 'gate': gate}
+        for key, (dtype, default) in PATTERN_LAYERS.items():
+            if key != 'gate':
+                pat[key] = np.array(layers[key], dtype=dtype).reshape(gate.shape) if key in layers else np.full(gate.shape, default, dtype)
+        return pat
+
+    def _show_pattern(self, idx):
+        self.pattern = idx
+        for ch, row in zip(self.channels, self.patterns[idx]['gate']):
+            ch['steps'] = row
+
+    def set_step(self, ch_idx, step_idx, val, vel=None, prob=None, shift=None):
+        """Set a step of the shown pattern: its gate, and optionally its velocity,
+        probability (0-1) and micro-offset (in steps, wrapping around the loop).
+        """
+        with self._publish_lock:
+            pat = self.patterns[self.pattern]
+            pat['gate'][ch_idx, step_idx] = val
+            for key, v in (('vel', vel), ('prob', prob), ('shift', shift)):
+                if v is not None: pat[key][ch_idx, step_idx] = v
+            self._pat_cache.pop(id(pat['gate']), None)
+            self._publish({})
+
+    def set_pattern_length(self, idx, steps):
+        """Resize pattern ``idx`` to ``steps`` steps; new steps take the layer defaults."""
+        with self._publish_lock:
+            pat = self.patterns[idx]
+            keep = min(steps, pat['gate'].shape[1])
+            for key, (dtype, default) in PATTERN_LAYERS.items():
+                layer = np.full((len(self.channels), steps), default, dtype=dtype)
+                layer[:, :keep] = pat[key][:, :keep]
+                pat[key] = layer
+            if idx == self.pattern: self._show_pattern(idx)
+            self._publish({})
+
+    def set_bpm(self, bpm):
+        """Set the tempo, clamped to BPM_RANGE; a tempo that is not positive is a ValueError
+        and changes nothing.
+        """
+        if not bpm > 0: raise ValueError(f"tempo {bpm} is not positive")
+        self.bpm = min(max(bpm, BPM_RANGE[0]), BPM_RANGE[1])
+        self.publish()
+
+    def set_channel(self, ch_idx, **params):
+        with self._publish_lock:
+            self.channels[ch_idx].update(params)
+            if 'insert' in params: self._compile_mixer()
+            self._publish({})
+
+    def set_insert(self, idx, **params):
+        """Change an insert's name, vol or target insert; a routing cycle raises ValueError and is undone.
+        The master has no target; any other insert targets another insert (None means the master).
+        """
+        t = params.get('target')
+        if t is not None and (idx == 0 or t == idx or not 0 <= t < len(self.mixer)):
+            raise ValueError(f"insert {idx} cannot target insert {t}")
+        with self._publish_lock:
+            old = dict(self.mixer[idx])
+            self.mixer[idx].update(params)
+            try:
+                self._compile_mixer()
+            except ValueError:
+                self.mixer[idx] = old
+                raise
+            self._publish({})
+
+    def set_insert_fx(self, idx, slot, spec):
+        """Put an effect spec (see ``MIXER_FX``) into an FX slot, or clear it with None."""
+        with self._publish_lock:
+            self.mixer[idx]['fx'][slot] = spec
+            self._compile_mixer()
+            self._publish({})
+
+    # ─── Track Freeze ─────────────────────────────────────────────────────────
+
+    def freeze_channel(self, ch_idx):
+        """Render channel ``ch_idx`` once and play the result instead of its steps.
+
+        Every bar of every pattern with hits on the channel becomes a stereo
+        buffer: the bar's hits at channel volume, pan and velocity, plus the
+        effects of the channel's insert if it is that insert's only source
+        and they are all linear (the insert then skips them live; see
+        ``_freeze_signature``). Bars with the same hits share a
+        buffer. Each buffer plays as two voices started on its bar line
+        (floored to a whole sample), so clips cut a frozen channel at bar
+        resolution. Hits sit at whole-sample offsets from the line, rounded
+        in absolute samples, so they land where the live steps would at any
+        tempo. Probability steps are printed
+        with one roll each (a pattern's first pass).
+
+        Any edit that changes what the channel plays (steps, sample, volume,
+        pan, routing, insert effects, tempo) thaws it again on the next publish.
+        """
+        if self.kit_loader and self.kit_loader.is_alive():
+            self.kit_loader.join()  # freeze the synthesized sample, not its silent placeholder
+        with self._publish_lock:
+            ch = self.channels[ch_idx]
+            sig = self._freeze_signature(ch_idx)
+            baked = sig[-1]
+            chain = [spec for spec in self.mixer[ch['insert']]['fx'] if spec] if baked else []
+            sps = (60 / self.bpm / 4) * SAMPLE_RATE
+            bar = 16 * sps
+            pan = ch['pan'] * math.pi / 2
+            stereo = (np.array([[math.cos(pan)], [math.sin(pan)]]) * ch['vol'] * ch['data']).astype(np.float32)
+            audio, bars = {}, {}
+            for p, pat in enumerate(self.patterns):
+                times, chans, vels, probs, keys, steps = self._compile_pattern(p, pat, sps)
+                on = chans == ch_idx
+                on &= (probs >= 1) | (step_chance(np.zeros(len(keys), np.uint64), keys.astype(np.uint64)) < probs)
+                for b in range(-(-steps // 16)):
+                    sel = on & (times >= b * bar) & (times < (b + 1) * bar)
+                    if not sel.any(): continue
+                    offs = np.floor(times[sel]).astype(np.int64) - math.floor(b * bar)
+                    key = (offs.tobytes(), vels[sel].tobytes())
+                    if key not in audio:
+                        audio[key] = self._freeze_bar(stereo, offs, vels[sel], chain)
+                    bars[(p, b)] = key
+            self.frozen[ch_idx] = {'sig': sig, 'data': ch['data'], 'baked': baked and bool(chain),
+                                   'audio': audio, 'bars': bars, 'off': {}}
+            self._build_bank()
+
+    def unfreeze_channel(self, ch_idx):
+        with self._publish_lock:
+            if self.frozen.pop(ch_idx, None) is None: return
+            self._layout = None
+            self._compile_mixer()
+            self._publish({})
+
+    @staticmethod
+    def _freeze_bar(stereo, offs, vels, chain):
+        # One bar's hits mixed dry, then through fresh copies of the insert's effects
+        # until the tail stays below FREEZE_FLOOR for longer than any delay line
+        n = int(offs.max()) + stereo.shape[1]
+        dry = np.zeros((2, n), dtype=np.float32)
+        for o, v in zip(offs, vels):
+            dry[:, o:o + stereo.shape[1]] += stereo * v
+        if not chain: return dry
+        fx = [make_fx(spec) for spec in chain]
+        quiet = FREEZE_CHUNK + max((f.n for f in fx if isinstance(f, DelayFx)), default=0)
+        out, pos, still = [], 0, 0
+        while pos < n + FREEZE_TAIL * SAMPLE_RATE:
+            block = np.zeros((2, FREEZE_CHUNK), dtype=np.float32)
+            if pos < n: block[:, :min(FREEZE_CHUNK, n - pos)] = dry[:, pos:pos + FREEZE_CHUNK]
+            for f in fx:
+                f.process(block)
+            out.append(block)
+            pos += FREEZE_CHUNK
+            if pos >= n:
+                still = still + FREEZE_CHUNK if np.abs(block).max() < FREEZE_FLOOR else 0
+                if still >= quiet: break
+        wet = np.concatenate(out, axis=1)
+        loud = np.flatnonzero(np.abs(wet).max(axis=0) >= FREEZE_FLOOR)
+        return wet[:, :max(n, int(loud[-1]) + 1 if len(loud) else 0)]
+
+    def _freeze_signature(self, c):
+        # Everything a channel's frozen audio depends on; the last item says whether
+        # the insert's effects are baked. That needs the channel to be the insert's
+        # only source, and every effect linear: bars are run through fresh effects
+        # one at a time and their wet tails summed, which only equals the effects
+        # running over the whole pattern if they are linear and time-invariant (EQ,
+        # delay). A compressor's gain depends on the overlapping bars, so it stays live.
+        ch = self.channels[c]
+        i = ch['insert']
+        alone = (i != 0 and sum(x['insert'] == i for x in self.channels) == 1
+                 and all(m['target'] != i for m in self.mixer))
+        rows = [b''.join(pat[k][c].tobytes() for k in PATTERN_LAYERS) if pat['gate'][c].any() else None
+                for pat in self.patterns]
+        while rows and rows[-1] is None: rows.pop()  # a new empty pattern changes nothing
+        fx = [dict(f) for f in self.mixer[i]['fx'] if f] if alone else None
+        bake = alone and all(MIXER_FX[f['type']].linear for f in fx)
+        return (id(ch['data']), ch['vol'], ch['pan'], i, self.bpm, fx, tuple(rows), bake)
+
+    def _thaw_stale(self):
+        # A record holds its channel's sample, so the id in its signature cannot be reused
+        stale = [c for c, fr in self.frozen.items() if c >= len(self.channels) or self._freeze_signature(c) != fr['sig']]
+        if not stale: return
+        for c in stale:
+            del self.frozen[c]
+        self._layout = None
+        self._compile_mixer()
+
+    def _freeze_layout(self):
+        # Frozen buffers as snapshot channels after the rack's, a left/right pair
+        # per buffer, plus each pattern's (bar, channel) events that start them
+        owner, off, lens, pan, events = [], [], [], [], {}
+        base = len(self.channels)
+        for c in sorted(self.frozen):
+            fr = self.frozen[c]
+            slot = {}
+            for key, a in fr['audio'].items():
+                slot[key] = base + len(owner)
+                n = a.shape[1]
+                owner += [c, c]
+                off += [fr['off'][key], fr['off'][key] + n]
+                lens += [n, n]
+                pan += [0.0, 1.0]
+            for (p, b), key in fr['bars'].items():
+                bars, chans = events.setdefault(p, ([], []))
+                bars += [b, b]
+                chans += [slot[key], slot[key] + 1]
+        return {'channels': np.array(sorted(self.frozen), dtype=np.int64), 'owner': owner,
+                'off': off, 'len': lens, 'pan': pan, 'events': events}
+
+    def set_song_mode(self, on):
+        self.song_mode = on
+        self.publish()
+
+    def select_pattern(self, idx):
+        """Show pattern ``idx`` in the rack; one past the last creates an empty pattern."""
+        with self._publish_lock:
+            if idx == len(self.patterns):
+                steps = self.patterns[self.pattern]['gate'].shape[1] if self.patterns else 16
+                self.patterns.append(self.make_pattern(f'Pattern {idx + 1}', np.zeros((len(self.channels), steps))))
+            self._show_pattern(idx)
+            self._publish({})
+
+    def _index_clips(self):
+        clips = self.clips
+        self.song = ClipIndex([c['start'] for c in clips], [c['length'] for c in clips], [c['pattern'] for c in clips])
+
+    def add_clip(self, pattern, start, length=1, track=0):
+        with self._publish_lock:
+            self.clips.append({'pattern': pattern, 'start': start, 'length': length, 'track': track})
+            self._index_clips()
+            self._publish({})
+
+    def remove_clip(self, idx):
+        with self._publish_lock:
+            del self.clips[idx]
+            self._index_clips()
+            self._publish({})
+
+    def play_stop(self):
+        self.transport = not self.transport
+        self.commands.push('play' if self.transport else 'stop')
+
+    # ─── Audio Thread ─────────────────────────────────────────────────────────
+
+    def drain_commands(self):
+        cmd = self.commands.pop()
+        while cmd is not None:
+            if cmd[0] == 'play':
+                self.playing = True
+            elif cmd[0] == 'stop':
+                self.playing = False
+                self.sample_pos = 0
+                self.current_step = 0
+                self.voices.clear()
+                self.streams.clear()
+            cmd = self.commands.pop()
 
     def callback(self, outdata, frames, time, status):
-        out = np.zeros((frames, 2), dtype=np.float32)
-        
+        if status and (status.output_underflow or status.output_overflow):
+            self.load.xrun()
+        if self.audit is not None:
+            self.audit.run(self.process, outdata, frames)
+        else:
+            self.process(outdata, frames)
+
+    def _ensure_scratch(self, frames, buses):
+        # Reallocated only when the block size or active bus count changes
+        if self._buses.shape != (2 * buses, frames):
+            self._buses = np.zeros((2 * buses, frames), dtype=np.float32)
+            self.voices.prepare(frames)
+
+    def process(self, outdata, frames):
+        stamp = self.load.stamp
+        stamp(0)
+        self.drain_commands()
+        snap = self.snapshot
+        if snap.bank is not self._bank:
+            # Samples moved: bank offsets held by voices are stale
+            self.voices.clear()
+            self._bank = snap.bank
+        if snap.mixer is not self._graph:
+            self.voices.set_routing(snap.mixer.rows)
+            self._graph = snap.mixer
+            self.insert_cost.fill(0)
+        self._ensure_scratch(frames, snap.mixer.buses)
+
         if self.playing:
-            sps = (60 / self.bpm / 4) * SAMPLE_RATE
             start = self.sample_pos
             end = start + frames
+            self.current_step = int(start / snap.sps) % snap.pat_steps[snap.pattern]
             
-            # Sequencer Logic
-            start_step = int(start / sps)
-            end_step = int(end / sps)
-            
-            for s in range(start_step, end_step + 1):
-                trigger_time = int(s * sps)
-                if start <= trigger_time < end:
-                    offset = trigger_time - start
-                    step_idx = s % 16
-                    self.current_step = step_idx
-                    
-                    # Pattern Mode looping logic (Song mode placeholder)
-                    for ch in self.channels:
-                        if ch['steps'][step_idx]:
-                            # In song mode we would check playlist, here we assume PAT mode for audio engine demo
-                            self.voices.append(Voice(ch['data'], ch['vol'], ch['pan']))
+            # Sequencer Logic: events in [start, end)
+            if not snap.song_mode:
+                self._trigger_pattern(snap, snap.pattern, 0, start, end, start)
+            elif snap.song.length > 0:
+                # Song loops at its end; clips under the block come from the interval index.
+                # Clip origins are whole samples, so a loop's hits lie in [floor, ceil) of its
+                # span, and neighbouring loops may share one sample
+                loop_len = snap.loop_len
+                song_len = snap.song.length * loop_len
+                for k in range(int(start // song_len), math.ceil(end / song_len)):
+                    base = k * song_len
+                    a, b = max(start, math.floor(base)), min(end, math.ceil(base + song_len))
+                    for c in snap.song.query((a - base) / loop_len, (b - base) / loop_len):
+                        origin = math.floor(base + snap.song.start[c] * loop_len)
+                        length = (snap.song.end[c] - snap.song.start[c]) * loop_len
+                        self._trigger_pattern(snap, snap.song.pattern[c], origin, max(a, origin), b, start, length)
                             
             self.sample_pos += frames
-
-        # Render Voices
-        active = []
-        mix_energy = [0.0] * len(self.meter_levels)
-        
-        for v in self.voices:
-            remain = len(v.data) - v.pos
-            if remain <= 0: continue
-            
-            count = min(frames, remain)
-            chunk = v.data[v.pos:v.pos+count] * v.vol
-            
-            # Panning
-            l_gain = np.cos(v.pan * np.pi / 2)
-            r_gain = np.sin(v.pan * np.pi / 2)
-            
-            out[:count, 0] += chunk * l_gain
-            out[:count, 1] += chunk * r_gain
-            
-            v.pos += count
-            if v.pos < len(v.data):
-                active.append(v)
-            
-            # Metering (Approximate)
-            peak = np.max(np.abs(chunk))
-            # Find channel index (slow lookup but fine for 5 chans)
-            for i, ch in enumerate(self.channels):
-                if ch['data'] is v.data:
-                    mix_energy[i] = max(mix_energy[i], peak)
-        
-        self.voices = active
-        
-        # Master Meter
-        master_peak = np.max(np.abs(out)) if len(out) > 0 else 0
-        mix_energy[-1] = master_peak
+        stamp(1)
+
+        # Render voices into insert buses, then run the mixer (meters per insert)
+        buses = self._buses
+        energy = self._energy
+        buses.fill(0)
+        energy.fill(0)
+        self.voices.render(snap.bank, frames, buses)
+        self.streams.render(buses, snap.mixer.rows, frames)
+        stamp(2)
+        snap.mixer.process(buses, energy, self.insert_cost)
+        mix = buses[:2]
+        stamp(3)
         
         # Update shared meter state with decay
-        for i in range(len(self.meter_levels)):
-            self.meter_levels[i] = max(mix_energy[i], self.meter_levels[i] * 0.9)
+        np.multiply(self.meter_levels, 0.9, out=self.meter_levels)
+        np.maximum(energy, self.meter_levels, out=self.meter_levels)
+        stamp(4)
 
         # Soft clip
-        np.clip(out, -1.0, 1.0, out=out)
-        outdata[:] = out
-
-    def start(self):
+        np.clip(mix, -1.0, 1.0, out=mix)
+        outdata[:] = mix.T
+        self.tap.push(mix)
+        stamp(5)
+        self.load.commit(frames)
+
+    def _trigger_pattern(self, snap, pat, origin, w0, w1, start, length=None):
+        """Trigger events of pattern ``pat`` looping from ``origin`` that fall in [w0, w1).
+        A clip ``length`` (samples) cuts the events by their position in the clip, so
+        the cut does not depend on block boundaries. The block's events are one
+        searchsorted window of the compiled pattern, whatever the pattern count.
+        A whole pass starting in the window streams the pattern's cached render
+        instead, and the rest of a streaming pass triggers nothing. Passes start
+        on whole samples, so voices and the cached render (whose hits sit at
+        whole offsets from its start) put every hit on the same sample.
+        """
+        times, chans, vels, probs, keys = (snap.pat_times[pat], snap.pat_chans[pat], snap.pat_vels[pat],
+                                           snap.pat_probs[pat], snap.pat_keys[pat])
+        loop_len = snap.pat_steps[pat] * snap.sps
+        render = snap.passes[pat]
+        for k in range(int((w0 - origin) // loop_len), math.ceil((w1 - origin) / loop_len)):
+            base = math.floor(origin + k * loop_len)
+            if length is not None and length - k * loop_len <= 0: break
+            if self.streams.playing(pat, base): continue
+            if render is not None and base >= w0 and (length is None or length - k * loop_len >= loop_len):
+                self.streams.start(render, pat, base, int(base) - start)
+                continue
+            lo = np.searchsorted(times, w0 - base, 'left')
+            hi = np.searchsorted(times, w1 - base, 'left')
+            if length is not None:
+                hi = min(hi, np.searchsorted(times, length - k * loop_len, 'left'))
+            for e in range(lo, hi):
+                if probs[e] < 1 and step_chance(int(base), int(keys[e])) >= probs[e]: continue
+                offset = int(base + times[e]) - start
+                c = chans[e]
+                self.voices.trigger(c, c, snap.inserts[c], snap.sample_off[c], snap.sample_len[c],
+                                    snap.vol[c] * vels[e], snap.pan[c], offset)
+
+    def start(self, backend=None, **options):
+        """Start calling back from ``backend``: a name in AUDIO_BACKENDS (built with
+        ``options``) or a backend instance. A device that fails to open falls back
+        to a null backend paced to real time, so the transport still runs; so does
+        an unknown name, or ``file`` without a ``path``.
+        """
+        backend = backend or AUDIO_BACKEND
         try:
-            self.stream = sd.OutputStream(channels=2, callback=self.callback, samplerate=SAMPLE_RATE, blocksize=BLOCK_SIZE)
-            self.stream.start()
-        except:
-            print("Audio Device Error - Running in silent mode")
-        
-    def play_stop(self):
-        if self.playing:
-            self.playing = False
-            self.sample_pos = 0
-            self.current_step = 0
-            self.voices = []
-        else:
-            self.playing = True
+            if isinstance(backend, str):
+                if backend not in AUDIO_BACKENDS:
+                    raise ValueError(f"unknown audio backend {backend!r}, expected one of {', '.join(AUDIO_BACKENDS)}")
+                if backend == 'file' and not options.get('path'):
+                    raise ValueError("the file backend needs a path")
+                backend = AUDIO_BACKENDS[backend](self.callback, **options)
+            backend.start()
+        except Exception as e:
+            print(f"Audio Device Error ({e}) - Running in silent mode")
+            backend = NullBackend(self.callback, speed=1.0)
+            backend.start()
+        self.backend = backend
+        self.publish()  # passes now render in the background
+        return backend
+
+    def stop(self):
+        if self.backend:
+            self.backend.stop()
+            self.backend = None
             
-    def export_wav(self, path):
-        # Render 4 loops
-        sps = int((60 / self.bpm / 4) * SAMPLE_RATE)
-        total_len = sps * 16 * 4
-        out = np.zeros((total_len, 2), dtype=np.float32)
-        
-        for bar in range(4):
-            for s in range(16):
-                time_idx = (bar * 16 + s) * sps
-                for ch in self.channels:
-                    if ch['steps'][s]:
-                        l_gain = np.cos(ch['pan'] * np.pi / 2)
-                        r_gain = np.sin(ch['pan'] * np.pi / 2)
-                        
-                        slen = len(ch['data'])
-                        if time_idx + slen < total_len:
-                            out[time_idx:time_idx+slen, 0] += ch['data'] * ch['vol'] * l_gain
-                            out[time_idx:time_idx+slen, 1] += ch['data'] * ch['vol'] * r_gain
-
-        # Normalize and save
-        m = np.max(np.abs(out))
-        if m > 0: out /= m
-        
-        with wave.open(path, 'w') as f:
-            f.setnchannels(2)
-            f.setsampwidth(2)
-            f.setframerate(SAMPLE_RATE)
-            f.writeframes((out * 32767).astype(np.int16).tobytes())
+    # ─── Offline Rendering ────────────────────────────────────────────────────
+
+    def song_hits(self, bars=4, seconds=None, snap=None, cached=True):
+        """All triggers of the song as (time, channel, velocity) arrays, the trigger span
+        and the cached passes streamed instead, as (start, pattern) arrays.
+        Follows the snapshot's mode: the current pattern looped, or the arrangement looped
+        at its end, with the same arithmetic as the callback. Like the callback, whole
+        passes of a pattern with a cached render stream it (unless not ``cached``);
+        a pass is only streamed if all its hits fall inside the span.
+        """
+        snap = snap or self.snapshot
+        loop_len = snap.loop_len
+        span = int(round(seconds * SAMPLE_RATE)) if seconds is not None else int(bars * loop_len)
+        parts = [(np.zeros(0, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float32))]
+        streams = [(np.zeros(0), np.zeros(0, np.int64))]
+
+        def play(p, origin, cut=None):
+            origin = np.floor(origin)  # passes start on whole samples, as in the callback
+            if cached and snap.passes[p] is not None:
+                whole = origin + snap.pat_times[p][-1] < span
+                if cut is not None: whole &= cut >= snap.pat_steps[p] * snap.sps
+                streams.append((origin[whole], np.full(np.count_nonzero(whole), p)))
+                origin, cut = origin[~whole], None if cut is None else cut[~whole]
+            parts.append(self._pass_hits(snap, p, origin, cut))
+
+        if not snap.song_mode:
+            p = snap.pattern
+            loop = snap.pat_steps[p] * snap.sps
+            play(p, np.arange(int(span // loop) + 1) * loop)
+        elif snap.song.length > 0:
+            # One origin per (song loop, clip, pattern pass); the clip end cuts its last pass
+            song = snap.song
+            base = np.arange(int(span // (song.length * loop_len)) + 1) * (song.length * loop_len)
+            for p in np.unique(song.pattern):
+                clips = np.flatnonzero(song.pattern == p)
+                loop = snap.pat_steps[p] * snap.sps
+                length = (song.end[clips] - song.start[clips]) * loop_len
+                passes = np.ceil(length / loop).astype(np.int64)
+                clip = np.repeat(clips, passes)
+                k = np.arange(len(clip)) - np.repeat(np.cumsum(passes) - passes, passes)
+                origin = (np.floor(base[:, None] + song.start[clip] * loop_len) + k * loop).ravel()
+                cut = np.tile(np.repeat(length, passes) - k * loop, len(base))
+                play(p, origin, cut)
+        hit_t, hit_c, hit_v = (np.concatenate(h) for h in zip(*parts))
+        keep = hit_t < span
+        return hit_t[keep], hit_c[keep], hit_v[keep], span, tuple(np.concatenate(s) for s in zip(*streams))
+
+    def _pass_hits(self, snap, p, origin, cut=None):
+        """Hits of pattern ``p`` played once from each of ``origin`` (samples), as one mask
+        over (pass, event): inside the clip ``cut`` and passing the probability roll.
+        """
+        times, probs = snap.pat_times[p], snap.pat_probs[p]
+        t = origin[:, None] + times[None, :]
+        on = np.ones(t.shape, dtype=bool) if cut is None else times[None, :] < cut[:, None]
+        if len(probs) and probs.min() < 1:
+            roll = step_chance(np.floor(origin).astype(np.uint64)[:, None], snap.pat_keys[p].astype(np.uint64)[None, :])
+            on &= (probs >= 1) | (roll < probs)
+        return (np.floor(t[on]).astype(np.int64),
+                np.broadcast_to(snap.pat_chans[p], t.shape)[on],
+                np.broadcast_to(snap.pat_vels[p], t.shape)[on])
+
+    def render_blocks(self, bars=4, seconds=None, rows=RENDER_ROWS, snap=None, hits=None, channels=None):
+        """Yield the offline mix as consecutive (n, 2) float32 blocks, sample tails included.
+
+        Sparse channels are strided-added (one slice add per hit and batch; a
+        hit that runs past the batch carries on into the next). Dense channels,
+        where a sample overlaps many of its own retriggers, are rendered as an
+        impulse train convolved with the sample by FFT overlap-add, if the
+        sample fits in one ``RENDER_SEG`` segment. Channels land on their insert
+        buses, and each block runs through a fresh copy of the mixer graph (see
+        ``MixerGraph.offline``). The batch shrinks with the bus count, so the
+        accumulator stays about the size of one stereo batch of ``rows``
+        segments, however long the samples are. Renders from one snapshot, so
+        it is safe to run off the UI thread.
+
+        Cached pattern passes (see ``song_hits``) are added to their insert
+        buses a batch slice at a time, so repeats of a pattern cost a copy.
+
+        ``hits`` takes a precomputed ``song_hits`` result (then ``bars`` and
+        ``seconds`` are ignored). ``channels`` solos a subset of rack channels
+        (with their frozen buffers); the length stays that of the full mix, so
+        solo renders line up with it. Passes mix all channels, so solo renders
+        take hits from ``song_hits(cached=False)``.
+        """
+        snap = snap or self.snapshot
+        hit_t, hit_c, hit_v, span, (str_t, str_p) = hits or self.song_hits(bars, seconds, snap, cached=channels is None)
+        n_ch = len(snap.vol)
+        if n_ch == 0: return
+        lens = snap.sample_len
+        str_t = np.floor(str_t).astype(np.int64)
+        renders = [snap.passes[p] for p in str_p]
+        str_end = str_t + np.array([r.length for r in renders], dtype=np.int64)
+        total = max([span] + str_end.tolist() + ([int(np.max(hit_t + lens[hit_c]))] if len(hit_t) else []))
+        if channels is None:
+            # Pass renders carry per-insert audio: map their inserts along with the channels'
+            pass_ins = np.array(sorted({i for r in renders for i in r.inserts}), dtype=np.int64)
+            graph, bus, bus_gain = snap.mixer.offline(np.concatenate([snap.inserts, pass_ins]))
+            ins_bus = dict(zip(pass_ins.tolist(), zip(bus[n_ch:].tolist(), bus_gain[n_ch:].tolist())))
+            bus, bus_gain = bus[:n_ch], bus_gain[:n_ch]
+        else:
+            # Only the soloed channels' inserts are compiled; the rest get zero gain
+            channels = np.flatnonzero(np.isin(snap.owner, channels))
+            graph, solo_bus, solo_gain = snap.mixer.offline(snap.inserts[channels])
+            bus, bus_gain = np.zeros(n_ch, dtype=np.int64), np.zeros(n_ch)
+            bus[channels], bus_gain[channels] = solo_bus, solo_gain
+        rows = max(1, rows // graph.buses)
+        seg, nfft = RENDER_SEG, 2 * RENDER_SEG
+        batch = rows * seg
+
+        pans = snap.pan.astype(np.float64) * np.pi / 2
+        gains = np.stack([np.cos(pans), np.sin(pans)], axis=1) * (snap.vol * bus_gain)[:, None]
+        keep = gains[hit_c].any(axis=1)  # silent and muted channels cost nothing
+        hit_t, hit_c, hit_v = hit_t[keep], hit_c[keep], hit_v[keep]
+        work = np.bincount(hit_c, weights=lens[hit_c], minlength=n_ch)
+        dense = np.flatnonzero((work > OLA_DENSITY * max(span, 1)) & (lens <= seg))
+        slot = np.full(n_ch, -1)
+        slot[dense] = np.arange(len(dense))
+        if len(dense):
+            spec = np.stack([np.fft.rfft(snap.bank[snap.sample_off[c]:snap.sample_off[c] + lens[c]], n=nfft) for c in dense])
+            spec_l = (spec * gains[dense, 0][:, None]).astype(np.complex64)
+            spec_r = (spec * gains[dense, 1][:, None]).astype(np.complex64)
+
+        order = np.argsort(hit_t, kind='stable')
+        hit_t, hit_c, hit_v = hit_t[order], hit_c[order], hit_v[order]
+        # Sparse hits with their stereo gain; those still sounding are carried to the next batch
+        sparse = slot[hit_c] < 0
+        sp_t, sp_c = hit_t[sparse], hit_c[sparse]
+        sp_g = (gains[sp_c] * hit_v[sparse][:, None]).astype(np.float32)
+        run_t, run_c, run_g = sp_t[:0], sp_c[:0], sp_g[:0]
+        acc = np.zeros((batch + seg, 2 * graph.buses), dtype=np.float32)
+        tmp = np.zeros(batch, dtype=np.float32)
+        for b0 in range(0, total, batch):
+            for s in np.flatnonzero((str_t < b0 + batch) & (str_end > b0)):
+                r, t0 = renders[s], int(str_t[s])
+                a, b = max(b0, t0), min(b0 + batch, t0 + r.length)
+                for j, ins in enumerate(r.inserts):
+                    row, g = ins_bus[ins]
+                    src = r.audio[2*j:2*j+2, a - t0:b - t0].T
+                    acc[a - b0:b - b0, 2*row:2*row+2] += src if g == 1 else src * np.float32(g)
+
+            lo, hi = np.searchsorted(sp_t, [b0, b0 + batch])
+            run_t = np.concatenate([run_t, sp_t[lo:hi]])
+            run_c = np.concatenate([run_c, sp_c[lo:hi]])
+            run_g = np.concatenate([run_g, sp_g[lo:hi]])
+            for t, c, g in zip(run_t - b0, run_c, run_g):
+                a, o = max(t, 0), snap.sample_off[c] + max(-t, 0)
+                n = min(lens[c] - max(-t, 0), batch - a)
+                for k in (0, 1):
+                    np.multiply(snap.bank[o:o + n], g[k], out=tmp[:n])
+                    acc[a:a + n, 2*bus[c]+k] += tmp[:n]
+            going = run_t + lens[run_c] > b0 + batch
+            run_t, run_c, run_g = run_t[going], run_c[going], run_g[going]
+
+            if len(dense):
+                lo, hi = np.searchsorted(hit_t, [b0, b0 + batch])
+                sel = slot[hit_c[lo:hi]]
+                keep = sel >= 0
+                flat = sel[keep] * batch + (hit_t[lo:hi][keep] - b0)
+                imp = np.bincount(flat, weights=hit_v[lo:hi][keep], minlength=len(dense) * batch).astype(np.float32)
+                x = np.fft.rfft(imp.reshape(len(dense), rows, seg), n=nfft, axis=-1)
+                for r in np.unique(bus[dense]):
+                    on = bus[dense] == r
+                    for k, sp in enumerate((spec_l, spec_r)):
+                        y = np.fft.irfft(np.einsum('crf,cf->rf', x[on], sp[on]), n=nfft, axis=-1)
+                        # Overlap-add: every segment's tail lands on the next segment
+                        acc[:batch, 2*r+k] += y[:, :seg].ravel()
+                        acc[seg:, 2*r+k] += y[:, seg:].ravel()
+
+            m = min(batch, total - b0)
+            graph.process(acc[:m].T)
+            yield acc[:m, :2].copy()
+            acc[:seg] = acc[batch:]
+            acc[seg:] = 0
+
+    @staticmethod
+    def _render_bytes(buses):
+        # Working set of render_blocks on a graph of ``buses`` buses: accumulator, scratch
+        # row and yielded block, plus the FFT path's spectra of one batch
+        rows = max(1, RENDER_ROWS // buses)
+        return 4 * RENDER_SEG * ((rows + 1) * 2 * buses + 3 * rows) + 48 * rows * RENDER_SEG
+
+    def render_offline(self, bars=4, seconds=None):
+        self.render_passes()
+        blocks = list(self.render_blocks(bars, seconds))
+        return np.concatenate(blocks) if blocks else np.zeros((0, 2), dtype=np.float32)
+
+    def export_wav(self, path, bars=4, seconds=None, fmt='pcm16', normalize=True, progress=None, cancel=None):
+        """Stream the song to ``path``. Peak memory is one render batch, whatever the length.
+
+        The WAV is written to a temp file next to ``path`` and renamed over it
+        once complete, so ``path`` never holds a partial render. With
+        ``normalize`` the raw float mix is first spooled to a second temp file
+        while the peak is tracked, then read back through a memory map, scaled
+        and written. Renders from the snapshot taken at the call, so it can run
+        off the UI thread (see ``ExportJob``): ``progress`` gets the rendered
+        fraction after every batch, and setting the ``cancel`` event stops at
+        the next one, removes the temp files and returns None. Otherwise
+        returns the number of frames written.
+        """
+        self.render_passes()
+        snap = self.snapshot
+        hits = self.song_hits(bars, seconds, snap)
+        blocks = self._export_blocks(snap, hits, progress, cancel)
+        tmp, spool = path + '.tmp', path + '.f32.tmp'
+        peak, frames = 0.0, 0
+        try:
+            if not normalize:
+                with WavWriter(tmp, fmt) as w:
+                    for block in blocks:
+                        w.write(block)
+                        frames += len(block)
+            else:
+                with open(spool, 'wb') as f:
+                    for block in blocks:
+                        peak = max(peak, float(np.max(np.abs(block))) if len(block) else 0.0)
+                        f.write(block.tobytes())
+                        frames += len(block)
+                if cancel is not None and cancel.is_set(): return None
+                gain = 1.0 / peak if peak > 0 else 1.0
+                with WavWriter(tmp, fmt) as w:
+                    if frames:
+                        data = np.memmap(spool, dtype=np.float32, mode='r', shape=(frames, 2))
+                        for i in range(0, frames, 65536):
+                            w.write(data[i:i+65536] * gain)
+                        del data
+            if cancel is not None and cancel.is_set(): return None
+            os.replace(tmp, path)
+        finally:
+            for f in (tmp, spool):
+                if os.path.exists(f): os.remove(f)
+        return frames
+
+    def _export_blocks(self, snap, hits, progress=None, cancel=None, channels=None):
+        # render_blocks for an export: stops early once ``cancel`` is set and reports the
+        # rendered share of the span (the sample tail past it counts as done)
+        done, span = 0, max(hits[3], 1)
+        for block in self.render_blocks(snap=snap, hits=hits, channels=channels):
+            if cancel is not None and cancel.is_set(): return
+            yield block
+            done += len(block)
+            if progress is not None: progress(min(done / span, 1.0))
+
+    def export_stems(self, folder, bars=4, seconds=None, fmt='pcm16', workers=None, progress=None, cancel=None):
+        """Write every channel to its own WAV in ``folder``, as if soloed; returns the frames per stem.
+
+        The song's triggers are compiled once and shared. Each stem renders only
+        its channel's hits through its own copy of the mixer, on a thread pool:
+        the heavy loops are numpy and drop the GIL, and the threads share the
+        triggers and the snapshot's sample bank read-only instead of pickling
+        them to processes. A stem holds one fixed-size render batch, whatever
+        the sample lengths, and no more stems run at once than fit in
+        ``EXPORT_MEMORY`` (``workers`` only lowers that). Stems are written at
+        mix level (not normalized) and all have the length of the full mix, so
+        they line up and sum back to the dry mix.
+
+        Stems go to temp files that are renamed into place only once all of them
+        are complete. ``progress`` and ``cancel`` work as in ``export_wav``, the
+        fraction counting all stems together.
+        """
+        snap = self.snapshot
+        hits = self.song_hits(bars, seconds, snap, cached=False)
+        os.makedirs(folder, exist_ok=True)
+        paths = []
+        for i, ch in enumerate(self.channels[:int(np.sum(snap.owner == np.arange(len(snap.owner))))]):
+            name = "".join(c if c.isalnum() or c in " -_()" else "_" for c in ch['name']).strip()
+            paths.append(os.path.join(folder, f"{i + 1:02d} {name or 'Channel'}.wav"))
+        share = [0.0] * len(paths)  # rendered fraction per stem; each slot has one writer
+
+        def stem(c):
+            def report(f):
+                share[c] = f
+                progress(sum(share) / len(paths))
+
+            frames = 0
+            with WavWriter(paths[c] + '.tmp', fmt) as w:
+                for block in self._export_blocks(snap, hits, progress and report, cancel, channels=[c]):
+                    w.write(block)
+                    frames += len(block)
+            return frames
+
+        if not paths: return 0
+        try:
+            per = max(self._render_bytes(b) for b in range(1, MIXER_INSERTS + 1))  # a stem may use every insert
+            workers = max(1, min(workers or os.cpu_count() or 1, len(paths), EXPORT_MEMORY // per))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                frames = max(pool.map(stem, range(len(paths))))
+            if cancel is not None and cancel.is_set(): return None
+            for path in paths:
+                os.replace(path + '.tmp', path)
+        finally:
+            for path in paths:
+                if os.path.exists(path + '.tmp'): os.remove(path + '.tmp')
+        return frames
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # SECTION 2: UI (FL STUDIO 26 AESTHETIC)
 # ═══════════════════════════════════════════════════════════════════════════════
 
+class CanvasView:
+    """Retained view model for canvas items.
+
+    Remembers the last value sent for every (canvas, item, option) and queues
+    only values that changed; ``flush`` sends the queue once per frame, one
+    ``coords`` and at most one ``itemconfig`` per item. An idle UI makes no
+    Tcl calls, and nothing is read back from Tk.
+    """
+    def __init__(self):
+        self.shown = {}    # (canvas, item, option) -> value last sent; option 'xy' is the coords
+        self.pending = {}  # (canvas, item) -> {option: value}
+
+    def set(self, cv, item, **opts):
+        for k, v in opts.items():
+            key = (cv, item, k)
+            if self.shown.get(key) != v:
+                self.shown[key] = v
+                self.pending.setdefault((cv, item), {})[k] = v
+
+    def coords(self, cv, item, xy):
+        self.set(cv, item, xy=tuple(xy))
+
+    def created(self, cv, item, **opts):
+        """Record the values an item was just created with, so setting them again is free."""
+        for k, v in opts.items():
+            self.shown[(cv, item, k)] = tuple(v) if k == 'xy' else v
+
+    def forget(self, cv):
+        """Drop everything known about ``cv``'s items, before the canvas is redrawn."""
+        self.shown = {k: v for k, v in self.shown.items() if k[0] is not cv}
+        self.pending = {k: v for k, v in self.pending.items() if k[0] is not cv}
+
+    def flush(self):
+        for (cv, item), opts in self.pending.items():
+            xy = opts.pop('xy', None)
+            if xy is not None: cv.coords(item, xy)
+            if opts: cv.itemconfig(item, **opts)
+        self.pending.clear()
+
 class CatStudio26:
     # ── THEME 26 ──────────────────────────────────────────────────────────────
     C = {
@@ -305,16 +2660,41 @@ class CatStudio26:
         # Engine
         self.engine = AudioEngine()
         self.engine.load_kit()
-        self.engine.start()
+        # A null device from CAT26_AUDIO runs at wall-clock pace, not flat out beside Tk
+        self.engine.start(**({'speed': 1.0} if AUDIO_BACKEND == 'null' else {}))
+
+        # Sample library index; without a writable cache folder the browser walks the disk
+        try:
+            self.library = SampleIndex()
+        except (OSError, sqlite3.Error):
+            self.library = None
         
         # UI State
+        self.project_path = None
+        self.view = CanvasView()  # item updates go through here and are flushed once per frame
         self.meter_ids = []
-        self.step_ids = {} # (ch, step) -> id
-        self.knob_ids = {} # (ch, type) -> id
+        self.rack_rows = None # pooled rack rows: (tag, color strip id, name id, {knob: (needle id, x, y)})
+        self.rack_cells = [] # pooled step cells, per row slot
+        self.rack_heads = [] # step numbers, per column slot
+        self.rack_size = (0, 0) # pool rows, columns
+        self.rack_row0 = 0 # scroll position: first channel and step shown
+        self.rack_col0 = 0
+        self.rack_height = 0
+        self.rack_sel = 0 # selected channel: browser samples load into it
+        self.browser_paths = {} # browser item -> path
+        self.sample_dir = SAMPLE_DIR # the browser's root folder
+        self.browser_text = None
+        self.fx_ids = {} # (insert, slot) -> (rect id, label id)
+        self.time_text = None
         self.playhead_id = None
         self.playlist_playhead_id = None
         self.scope_line = None
+        self.spectrum_line = None
+        self.spectrum_db = np.full(SPECTRUM_BINS, -120.0)  # displayed bands, falling with decay
         self.cpu_line = None
+        self.export_job = None # running ExportJob, polled by animate
+        self.export_done = None # message shown when it completes
+        self.export_text = None
         
         # Toolstrip State
         self.pat_mode_btn = None
@@ -334,11 +2714,13 @@ class CatStudio26:
         # File Menu
         file_menu = tk.Menu(menubar, tearoff=0, bg=self.C["bg_dark"], fg=self.C["text_main"])
         file_menu.add_command(label="New Project", command=lambda: messagebox.showinfo("File", "New Project created!"))
-        file_menu.add_command(label="Open...", command=lambda: messagebox.showinfo("File", "Open Dialog..."))
-        file_menu.add_command(label="Save", command=lambda: messagebox.showinfo("File", "Project Saved!"))
-        file_menu.add_command(label="Save As...", command=lambda: messagebox.showinfo("File", "Save As Dialog..."))
+        file_menu.add_command(label="Open...", command=self.open_project)
+        file_menu.add_command(label="Save", command=self.save_project)
+        file_menu.add_command(label="Save As...", command=lambda: self.save_project(ask=True))
         file_menu.add_separator()
         file_menu.add_command(label="Export to WAV", command=self.do_export)
+        file_menu.add_command(label="Export Stems...", command=self.do_export_stems)
+        file_menu.add_command(label="Cancel Export", command=self.cancel_export)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.on_close)
         menubar.add_cascade(label="FILE", menu=file_menu)
@@ -355,6 +2737,7 @@ class CatStudio26:
         tools_menu = tk.Menu(menubar, tearoff=0, bg=self.C["bg_dark"], fg=self.C["text_main"])
         tools_menu.add_command(label="Audio Settings", command=lambda: messagebox.showinfo("Settings", "Audio Device: SoundDevice\nLatency: 11ms"))
         tools_menu.add_command(label="General Settings", command=lambda: None)
+        tools_menu.add_command(label="Dump DSP Load (CSV)...", command=self.dump_load)
         menubar.add_cascade(label="OPTIONS", menu=tools_menu)
 
         # Help Menu
@@ -401,10 +2784,11 @@ class CatStudio26:
         self.ent_bpm.bind("<Return>", self.update_bpm)
         self.ent_bpm.pack(side="left")
         
-        # CPU
+        # CPU: per-block DSP load history (full height = block deadline) and mean load / xruns
         cpu_f = tk.Canvas(stats, width=60, height=15, bg="#111", highlightthickness=0)
         cpu_f.pack(side="bottom", pady=2)
         self.cpu_line = cpu_f.create_line(0,15,0,15, fill="#F50057", width=1)
+        self.cpu_text = cpu_f.create_text(59, 1, text="", anchor="ne", fill="#B0BEC5", font=("Consolas", 6))
         self.cpu_cv = cpu_f 
 
         # 3. Oscilloscope (Visualizer)
@@ -413,9 +2797,22 @@ class CatStudio26:
         # Grid lines
         self.cv_scope.create_line(0, 30, 300, 30, fill="#222")
         self.cv_scope.create_line(150, 0, 150, 60, fill="#222")
-        self.scope_line = self.cv_scope.create_line(0,30,300,30, fill=self.C["accent"], width=2)
+        self.scope_line = self.cv_scope.create_line(0,30,300,30, fill=self.C["accent"], width=1)
+
+        # Spectrum: log frequency (30 Hz - 20 kHz) across, 0 to -72 dBFS down
+        self.cv_spectrum = Canvas(toolbar, width=160, height=60, bg="#050505", highlightthickness=1, highlightbackground="#333")
+        self.cv_spectrum.pack(side="right", pady=10)
+        for f in (100, 1000, 10000):
+            x = 160 * math.log(f / 30) / math.log(20000 / 30)
+            self.cv_spectrum.create_line(x, 0, x, 60, fill="#222")
+        self.spectrum_line = self.cv_spectrum.create_line(0,60,160,60, fill=self.C["accent"], width=1)
         tk.Label(toolbar, text="Cat's Monitor", bg=self.C["panel_grad"], fg="#555", font=("Arial", 7)).pack(side="right")
 
+        # Export progress while one runs in the background; click to cancel
+        self.lbl_export = tk.Label(toolbar, text="", bg=self.C["panel_grad"], fg=self.C["accent"], font=("Consolas", 9), cursor="hand2")
+        self.lbl_export.pack(side="right", padx=10)
+        self.lbl_export.bind("<Button-1>", lambda e: self.cancel_export())
+
         # ── MAIN SPLIT (FL Workflow: Browser Left, Rest Right) ──
         main_h_split = tk.PanedWindow(self.root, orient="horizontal", bg="#000", sashwidth=4, sashrelief="flat")
         main_h_split.pack(fill="both", expand=True)
@@ -424,16 +2821,21 @@ class CatStudio26:
         browser = tk.Frame(main_h_split, bg=self.C["bg_dark"])
         b_head = tk.Frame(browser, bg="#1E1E1E", height=25)
         b_head.pack(fill="x")
-        tk.Label(b_head, text="Browser - All", bg="#1E1E1E", fg="#AAA", font=("Arial", 8, "bold")).pack(side="left", padx=5)
+        self.lbl_browser = tk.Label(b_head, text="Browser - All", bg="#1E1E1E", fg="#AAA", font=("Arial", 8, "bold"))
+        self.lbl_browser.pack(side="left", padx=5)
+        tk.Button(b_head, text="📁", bg="#1E1E1E", fg="#AAA", bd=0, font=("Arial", 8), command=self.choose_sample_dir).pack(side="right", padx=2)
+
+        # Search the library index by name, or duration with <2 / >0.5s
+        self.ent_search = tk.Entry(browser, bg="#111", fg="#EEE", bd=0, font=("Consolas", 9), insertbackground="white")
+        self.ent_search.pack(fill="x", padx=2, pady=2)
+        self.ent_search.bind("<KeyRelease>", lambda e: self.search_browser())
         
-        tree = ttk.Treeview(browser, show="tree", padding=5)
-        tree.pack(fill="both", expand=True)
-        root_packs = tree.insert("", "end", text="Packs", open=True)
-        drums = tree.insert(root_packs, "end", text="Drums (ModeAudio)", open=True)
-        for d in ["Kick 808", "Snare Trap", "Hat Closed", "Percs", "Claps"]:
-            tree.insert(drums, "end", text=d)
-        inst = tree.insert(root_packs, "end", text="Instruments")
-        tree.insert(inst, "end", text="Sytrus Presets")
+        # Sample folders fill in as they are opened; clicking a file loads it into the selected channel
+        self.browser = ttk.Treeview(browser, show="tree", padding=5)
+        self.browser.pack(fill="both", expand=True)
+        self.browser.bind("<<TreeviewOpen>>", self.on_browser_open)
+        self.browser.bind("<ButtonRelease-1>", self.on_browser_click)  # a click, even on the selected file
+        self.open_sample_dir(self.sample_dir)
         
         btn_exp = tk.Button(browser, text="EXPORT WAV", bg="#111", fg=self.C["accent"], bd=0, command=self.do_export)
         btn_exp.pack(fill="x", pady=0)
@@ -452,10 +2854,29 @@ class CatStudio26:
         r_head = tk.Frame(rack_frame, bg="#2A2D35", height=24)
         r_head.pack(fill="x")
         tk.Label(r_head, text="Channel Rack", bg="#2A2D35", fg="#EEE", font=("Arial", 9, "bold")).pack(side="left", padx=5)
+        tk.Button(r_head, text="▶", bg="#2A2D35", fg="#AAA", bd=0, font=("Arial", 7),
+                  command=lambda: self.select_pattern(self.engine.pattern + 1)).pack(side="right", padx=2)
+        self.btn_length = tk.Button(r_head, text="16", bg="#2A2D35", fg="#AAA", bd=0, font=("Arial", 7),
+                                    command=self.cycle_pattern_length)
+        self.btn_length.pack(side="right", padx=2)
+        self.lbl_pattern = tk.Label(r_head, text="", bg="#2A2D35", fg=self.C["accent"], font=("Arial", 8, "bold"))
+        self.lbl_pattern.pack(side="right")
+        tk.Button(r_head, text="◀", bg="#2A2D35", fg="#AAA", bd=0, font=("Arial", 7),
+                  command=lambda: self.select_pattern(max(0, self.engine.pattern - 1))).pack(side="right", padx=2)
         
         self.cv_rack = Canvas(rack_frame, bg=self.C["bg_rack"], height=300, highlightthickness=0)
         self.cv_rack.pack(fill="both", expand=True, padx=5, pady=5)
-        self.draw_rack()
+        # One handler per event for the whole rack; rack_hit finds the target by arithmetic
+        self.cv_rack.bind("<Button-1>", lambda e: self.on_rack_click(e, True))
+        self.cv_rack.bind("<Button-3>", lambda e: self.on_rack_click(e, False))
+        self.cv_rack.bind("<MouseWheel>", lambda e: self.scroll_rack(rows=-1 if e.delta > 0 else 1))
+        self.cv_rack.bind("<Shift-MouseWheel>", lambda e: self.scroll_rack(cols=-4 if e.delta > 0 else 4))
+        self.cv_rack.bind("<Button-4>", lambda e: self.scroll_rack(rows=-1))
+        self.cv_rack.bind("<Button-5>", lambda e: self.scroll_rack(rows=1))
+        self.cv_rack.bind("<Shift-Button-4>", lambda e: self.scroll_rack(cols=-4))
+        self.cv_rack.bind("<Shift-Button-5>", lambda e: self.scroll_rack(cols=4))
+        self.cv_rack.bind("<Configure>", self.on_rack_resize)
+        self.select_pattern(self.engine.pattern)
         top_area.add(rack_frame, width=400) # Rack gets decent width
 
         # Playlist (Right of top)
@@ -466,6 +2887,7 @@ class CatStudio26:
         
         self.cv_playlist = Canvas(play_frame, bg="#141414", highlightthickness=0)
         self.cv_playlist.pack(fill="both", expand=True)
+        self.cv_playlist.bind("<Button-1>", self.on_playlist_click)
         self.draw_playlist()
         top_area.add(play_frame) # Playlist takes remaining width
 
@@ -493,69 +2915,152 @@ class CatStudio26:
         b.pack(side="left", padx=2)
         return b
 
+    def knob_xy(self, x, y, val):
+        rad = math.radians(135 + (val * 270))
+        return (x, y, x + 8 * math.cos(rad), y + 8 * math.sin(rad))
+
     def draw_knob(self, canvas, x, y, val, color, tags):
         canvas.create_oval(x-9, y-9, x+9, y+9, fill="#222", outline="#444", tags=tags)
-        angle = 135 + (val * 270)
-        rad = math.radians(angle)
-        ix = x + 8 * math.cos(rad)
-        iy = y + 8 * math.sin(rad)
-        canvas.create_line(x, y, ix, iy, fill=color, width=2, tags=tags)
+        xy = self.knob_xy(x, y, val)
+        lid = canvas.create_line(*xy, fill=color, width=2, tags=tags)
+        self.view.created(canvas, lid, xy=xy)
+        return lid
+
+    def step_fill(self, step_idx, is_on):
+        grp = (step_idx // 4) % 2
+        if is_on:
+            return self.C["bg_step_on"] if grp == 0 else self.C["bg_step_alt"]
+        return self.C["bg_step_off"] if grp == 0 else "#263238"
 
     # ── DRAWING & INTERACTION ──
 
+    RACK_TOP = 20      # step number header
+    RACK_ROW_H = 36    # channel row pitch; rows and cells are 26 px tall
+    RACK_STEP_X = 220  # x of the first visible step
+    RACK_STEP_W = 32   # step pitch; cells are 28 px wide
+
+    def rack_grid(self):
+        w, h = max(self.cv_rack.winfo_width(), 400), max(self.cv_rack.winfo_height(), 220)
+        return -(-(h - self.RACK_TOP) // self.RACK_ROW_H), -(-(w - self.RACK_STEP_X) // self.RACK_STEP_W), h
+
+    def rack_steps(self):
+        chans = self.engine.channels
+        return len(chans[0]['steps']) if chans else 16
+
     def draw_rack(self):
-        self.cv_rack.delete("all")
-        y = 15
-        
-        for i in range(16):
-            x = 220 + i * 32
-            col = "#FF5252" if i % 4 == 0 else "#666" 
-            self.cv_rack.create_text(x+14, y-10, text=str(i+1), fill=col, font=("Arial", 7))
-        y += 5
-
-        for i, ch in enumerate(self.engine.channels):
-            tags_ch = f"ch_name_{i}"
-            self.cv_rack.create_rectangle(60, y, 210, y+26, fill="#34373F", outline="#000", tags=tags_ch)
-            self.cv_rack.create_rectangle(205, y+2, 208, y+24, fill=ch['color'], outline="", tags=tags_ch)
-            self.cv_rack.create_text(70, y+13, text=ch['name'], fill="white", anchor="w", font=("Segoe UI", 9, "bold"), tags=tags_ch)
-            
-            self.cv_rack.tag_bind(tags_ch, "<Button-3>", lambda e, ci=i: self.on_channel_right_click(e, ci))
+        """Build the rack's item pool for the canvas size: channel widgets for each
+        visible row and a cell for each visible (row, step). Slots never move;
+        ``refresh_rack`` points them at the channels and steps under the scroll
+        position, so a 100 x 64 pattern costs no more items than a 5 x 16 one.
+        """
+        cv = self.cv_rack
+        cv.delete("all")
+        self.view.forget(cv)
+        rows, cols, h = self.rack_grid()
+        self.rack_size = (rows, cols)
+        self.rack_heads = [cv.create_text(self.RACK_STEP_X + c * self.RACK_STEP_W + 14, 5, text="", font=("Arial", 7))
+                           for c in range(cols)]
+        self.rack_rows, self.rack_cells = [], []
+        for r in range(rows):
+            y = self.RACK_TOP + r * self.RACK_ROW_H
+            tag = f"rackrow_{r}"
+            cv.create_rectangle(60, y, 210, y+26, fill="#34373F", outline="#000", tags=tag)
+            strip = cv.create_rectangle(205, y+2, 208, y+24, fill="", outline="", tags=tag)
+            name = cv.create_text(70, y+13, text="", fill="white", anchor="w", font=("Segoe UI", 9, "bold"), tags=tag)
+            knobs = {k: (self.draw_knob(cv, kx, y+13, 0.5, self.C["knob"], tag), kx, y+13) for k, kx in (('pan', 20), ('vol', 45))}
+            self.rack_rows.append((tag, strip, name, knobs))
+            self.rack_cells.append([cv.create_rectangle(x, y, x+28, y+26, fill="", outline="#111", width=1)
+                                    for x in range(self.RACK_STEP_X, self.RACK_STEP_X + cols * self.RACK_STEP_W, self.RACK_STEP_W)])
+        self.playhead_id = cv.create_line(self.RACK_STEP_X, 0, self.RACK_STEP_X, h, fill="#FFF", width=2, stipple="gray50")
+        self.rack_height = h
+        self.refresh_rack()
+
+    def refresh_rack(self):
+        """Fill the item pool from the engine at the scroll position; only changes reach Tk."""
+        if self.rack_rows is None:
+            self.draw_rack()
+            return
+        cv, view = self.cv_rack, self.view
+        chans = self.engine.channels
+        n_steps = self.rack_steps()
+        rows, cols = self.rack_size
+        # The last slot may be cut off by the canvas edge, so it does not count as room
+        self.rack_row0 = max(0, min(self.rack_row0, len(chans) - rows + 1))
+        self.rack_col0 = max(0, min(self.rack_col0, n_steps - cols + 1))
+        for c, tid in enumerate(self.rack_heads):
+            s = self.rack_col0 + c
+            view.set(cv, tid, text=str(s + 1) if s < n_steps else "", fill="#FF5252" if s % 4 == 0 else "#666")
+        for r, (tag, strip, name, knobs) in enumerate(self.rack_rows):
+            i = self.rack_row0 + r
+            if i >= len(chans):
+                view.set(cv, tag, state='hidden')
+                for rid in self.rack_cells[r]:
+                    view.set(cv, rid, state='hidden')
+                continue
+            ch = chans[i]
+            view.set(cv, tag, state='normal')
+            view.set(cv, strip, fill=ch['color'])
+            view.set(cv, name, text=self.channel_label(i), fill=self.C["accent"] if i == self.rack_sel else "white")
+            for k, (lid, kx, ky) in knobs.items():
+                view.coords(cv, lid, self.knob_xy(kx, ky, ch[k]))
+            for c in range(cols):
+                self.update_step_visual(i, self.rack_col0 + c)
+
+    def channel_label(self, i):
+        return ("❄ " if i in self.engine.frozen else "") + self.engine.channels[i]['name']
+
+    def rack_hit(self, x, y):
+        """What a rack click at (x, y) lands on, by arithmetic: (kind, channel, step) or None.
+        ``kind`` is 'step', 'name', 'pan' or 'vol'.
+        """
+        r, dy = divmod(int(y) - self.RACK_TOP, self.RACK_ROW_H)
+        ch = self.rack_row0 + r
+        if r < 0 or dy > 26 or ch >= len(self.engine.channels): return None
+        if x >= self.RACK_STEP_X:
+            c, dx = divmod(int(x) - self.RACK_STEP_X, self.RACK_STEP_W)
+            step = self.rack_col0 + c
+            return ('step', ch, step) if dx <= 28 and step < self.rack_steps() else None
+        if 60 <= x <= 210: return ('name', ch, None)
+        for k, kx in (('pan', 20), ('vol', 45)):
+            if abs(x - kx) <= 9: return (k, ch, None)
+        return None
+
+    def on_rack_click(self, event, is_left_click):
+        hit = self.rack_hit(event.x, event.y)
+        if hit is None: return
+        kind, ch, step = hit
+        if kind == 'step':
+            self.step_action(ch, step, is_left_click)
+        elif is_left_click:
+            if kind == 'name':
+                self.rack_sel = ch
+                self.refresh_rack()
+        elif kind == 'name':
+            self.on_channel_right_click(event, ch)
+        else:
+            self.reset_knob(ch, kind)
 
-            self.draw_knob(self.cv_rack, 20, y+13, ch['pan'], self.C["knob"], (f"knob_pan_{i}", "knob"))
-            self.draw_knob(self.cv_rack, 45, y+13, ch['vol'], self.C["knob"], (f"knob_vol_{i}", "knob"))
-            
-            self.cv_rack.tag_bind(f"knob_pan_{i}", "<Button-3>", lambda e, ci=i: self.reset_knob(ci, 'pan'))
-            self.cv_rack.tag_bind(f"knob_vol_{i}", "<Button-3>", lambda e, ci=i: self.reset_knob(ci, 'vol'))
-
-            for s in range(16):
-                x = 220 + s * 32
-                is_on = ch['steps'][s]
-                grp = (s // 4) % 2
-                
-                if is_on:
-                    fill_col = self.C["bg_step_on"] if grp == 0 else self.C["bg_step_alt"]
-                else:
-                    fill_col = self.C["bg_step_off"] if grp == 0 else "#263238"
-                
-                tags_step = f"step_{i}_{s}"
-                rid = self.cv_rack.create_rectangle(x, y, x+28, y+26, fill=fill_col, outline="#111", width=1, tags=tags_step)
-                
-                self.cv_rack.tag_bind(rid, "<Button-1>", lambda e, ci=i, si=s: self.step_action(ci, si, True))
-                self.cv_rack.tag_bind(rid, "<Button-3>", lambda e, ci=i, si=s: self.step_action(ci, si, False))
-                self.step_ids[(i, s)] = rid
+    def scroll_rack(self, rows=0, cols=0):
+        self.rack_row0 += rows
+        self.rack_col0 += cols
+        self.refresh_rack()
 
-            y += 36
+    def on_rack_resize(self, event):
+        if self.rack_grid()[:2] != self.rack_size:
+            self.draw_rack()
 
-        self.playhead_id = self.cv_rack.create_line(220, 0, 220, y, fill="#FFF", width=2, stipple="gray50")
+    PATTERN_COLORS = ["#2962FF", "#455A64", "#00B0FF", "#80D8FF", "#00E5FF"]
+    BEAT_W = 40  # playlist pixels per beat; a bar (one pattern loop) is 4 beats
 
     def draw_playlist(self):
         cv = self.cv_playlist
         cv.delete("all")
+        self.view.forget(cv)
         w = 1500
         h = 600
         
         # Grid lines (Measures)
-        beat_w = 40
+        beat_w = self.BEAT_W
         for i in range(32): # Draw more measures
              x = 60 + i * beat_w
              col = "#333" if i % 4 == 0 else "#222"
@@ -569,24 +3074,30 @@ class CatStudio26:
             cv.create_rectangle(0, y, 60, y+40, fill="#1E1E1E", outline="#333")
             cv.create_text(30, y+20, text=f"Track {t+1}", fill="#777", font=("Arial", 8))
             cv.create_line(0, y+40, w, y+40, fill="#222")
-            
-            # Pattern Clips (Simulation)
-            if t == 0:
-                # Pattern 1 placed at bar 1, length 2 bars
-                cv.create_rectangle(60, y, 60+(beat_w*16), y+40, fill="#2962FF", outline="#000", stipple="gray50")
-                cv.create_text(70, y+12, text="Pattern 1", fill="#FFF", anchor="w", font=("Arial", 8, "bold"))
-            if t == 1:
-                # Pattern 2 placed at bar 3
-                cv.create_rectangle(60+(beat_w*16), y, 60+(beat_w*32), y+40, fill="#455A64", outline="#000", stipple="gray50")
-                cv.create_text(70+(beat_w*16), y+12, text="Pattern 2", fill="#FFF", anchor="w", font=("Arial", 8, "bold"))
+
+        # Pattern Clips (right-click removes)
+        for i, clip in enumerate(self.engine.clips):
+            x = 60 + clip['start'] * 4 * beat_w
+            y = 25 + clip['track'] * 40
+            tags_clip = ("clip", f"clip_{i}")
+            col = self.PATTERN_COLORS[clip['pattern'] % len(self.PATTERN_COLORS)]
+            cv.create_rectangle(x, y, x + clip['length'] * 4 * beat_w, y+40, fill=col, outline="#000", stipple="gray50", tags=tags_clip)
+            cv.create_text(x+10, y+12, text=self.engine.patterns[clip['pattern']]['name'], fill="#FFF", anchor="w",
+                           font=("Arial", 8, "bold"), tags=tags_clip)
+            cv.tag_bind(f"clip_{i}", "<Button-3>", lambda e, ci=i: self.remove_clip(ci))
 
         # Playlist Playhead
         self.playlist_playhead_id = cv.create_line(60, 0, 60, h, fill="#00FF00", width=1)
 
+    FX_LABELS = {'eq': "EQ", 'comp': "COMP", 'delay': "DELAY"}
+
     def draw_mixer(self):
         cv = self.cv_mixer
         cv.delete("all")
+        self.view.forget(cv)
         self.meter_ids = []
+        self.cost_ids = []
+        self.fx_ids.clear()
         start_x = 20
         width = 45 # Wider faders
         gap = 5
@@ -594,7 +3105,7 @@ class CatStudio26:
         # FX Rack Area (Right Side Dock simulation)
         # We'll just draw strips here, user requested Bottom Mixer
         
-        for i in range(10): # Draw 10 Mixer Tracks
+        for i, ins in enumerate(self.engine.mixer): # Draw 10 Mixer Tracks
             x = start_x + i * (width + gap)
             is_master = (i == 0) # Master on left in FL often, or extreme right. Let's put left for visibility
             
@@ -605,26 +3116,31 @@ class CatStudio26:
             lbl = "M" if is_master else str(i)
             cv.create_text(x+width/2, 25, text=lbl, fill="#888", font=("Arial", 8, "bold"))
 
-            # FX Slots Mini Visual
-            for fx in range(3):
-                fy = 40 + fx * 12
-                cv.create_rectangle(x+4, fy, x+width-4, fy+10, fill="#222", outline="")
+            # FX Slots (click to load/clear an effect)
+            for slot, spec in enumerate(ins['fx']):
+                fy = 40 + slot * 12
+                tags_fx = f"fx_{i}_{slot}"
+                fill, label = self.fx_look(spec)
+                rid = cv.create_rectangle(x+4, fy, x+width-4, fy+10, fill=fill, outline="", tags=tags_fx)
+                tid = cv.create_text(x+width/2, fy+5, text=label, fill="#CCC", font=("Arial", 6), tags=tags_fx)
+                self.view.created(cv, rid, fill=fill)
+                self.view.created(cv, tid, text=label)
+                self.fx_ids[(i, slot)] = (rid, tid)
+                cv.tag_bind(tags_fx, "<Button-1>", lambda e, ii=i, si=slot: self.on_fx_slot_click(e, ii, si))
+
+            # Insert cost (µs per block)
+            tid = cv.create_text(x+width/2, 82, text="", fill="#555", font=("Arial", 6))
+            self.view.created(cv, tid, text="")
+            self.cost_ids.append((tid, i))
 
             # Meter BG
             meter_x = x + width - 12
             cv.create_rectangle(meter_x, 90, meter_x+8, 280, fill="#080808", outline="")
             
-            # Active Meter (We map 6 audio channels to 10 strips)
+            # Active Meter (engine meters are per insert, master at 0)
             mid = cv.create_rectangle(meter_x, 280, meter_x+8, 280, fill=self.C["accent"], outline="")
-            
-            # Map logical channel to mixer strip
-            # Master = 0, Chan 0-4 = Strip 1-5
-            if is_master:
-                self.meter_ids.append((mid, -1)) # -1 index for master logic
-            elif i <= 5:
-                self.meter_ids.append((mid, i-1)) # audio chan index
-            else:
-                self.meter_ids.append((mid, None)) # Unused
+            self.view.created(cv, mid, xy=(meter_x, 280, meter_x+8, 280))
+            self.meter_ids.append((mid, i, meter_x))
 
             # Fader Track line
             cv.create_line(x+15, 90, x+15, 280, fill="#000", width=2)
@@ -635,13 +3151,54 @@ class CatStudio26:
             cv.create_line(x+5, fader_y+17, x+25, fader_y+17, fill="#444")
 
             # Name at bottom
-            name = "Master" if is_master else (self.engine.channels[i-1]['name'] if i <= 5 else f"Insert {i}")
-            cv.create_text(x+width/2, 290, text=name[:6], fill="#666", font=("Arial", 7))
+            cv.create_text(x+width/2, 290, text=ins['name'][:6], fill="#666", font=("Arial", 7))
+
+    def on_fx_slot_click(self, event, ins_idx, slot):
+        m = tk.Menu(self.root, tearoff=0, bg="#111", fg="#EEE")
+        for kind, label in self.FX_LABELS.items():
+            m.add_command(label=label, command=lambda k=kind: self.set_fx(ins_idx, slot, {'type': k}))
+        m.add_separator()
+        m.add_command(label="(none)", command=lambda: self.set_fx(ins_idx, slot, None))
+        m.tk_popup(event.x_root, event.y_root)
+
+    def fx_look(self, spec):
+        return ("#2A3A4A", self.FX_LABELS[spec['type']]) if spec else ("#222", "")
+
+    def set_fx(self, ins_idx, slot, spec):
+        self.engine.set_insert_fx(ins_idx, slot, spec)
+        fill, label = self.fx_look(spec)
+        rid, tid = self.fx_ids[(ins_idx, slot)]
+        self.view.set(self.cv_mixer, rid, fill=fill)
+        self.view.set(self.cv_mixer, tid, text=label)
 
     # ── LOGIC ──
 
+    def select_pattern(self, idx):
+        self.engine.select_pattern(idx)
+        self.lbl_pattern.config(text=self.engine.patterns[idx]['name'])
+        self.btn_length.config(text=str(self.rack_steps()))
+        self.refresh_rack()
+
+    def cycle_pattern_length(self):
+        n = self.rack_steps()
+        steps = PATTERN_LENGTHS[(PATTERN_LENGTHS.index(n) + 1) % len(PATTERN_LENGTHS)] if n in PATTERN_LENGTHS else 16
+        self.engine.set_pattern_length(self.engine.pattern, steps)
+        self.select_pattern(self.engine.pattern)
+
+    def on_playlist_click(self, event):
+        # Empty lane space places the rack's current pattern (1 bar) at the clicked bar
+        if "clip" in self.cv_playlist.gettags("current"): return
+        track, bar = (event.y - 25) // 40, (event.x - 60) // (4 * self.BEAT_W)
+        if 0 <= track < 10 and bar >= 0:
+            self.engine.add_clip(self.engine.pattern, bar, 1, track)
+            self.draw_playlist()
+
+    def remove_clip(self, clip_idx):
+        self.engine.remove_clip(clip_idx)
+        self.draw_playlist()
+
     def set_mode(self, is_song):
-        self.engine.song_mode = is_song
+        self.engine.set_song_mode(is_song)
         if is_song:
             self.song_mode_btn.config(bg=self.C["accent"], fg="#000")
             self.pat_mode_btn.config(bg="#000", fg=self.C["accent"])
@@ -660,107 +3217,572 @@ class CatStudio26:
     def step_action(self, ch_idx, step_idx, is_left_click):
         if is_left_click:
             val = self.engine.channels[ch_idx]['steps'][step_idx]
-            self.engine.channels[ch_idx]['steps'][step_idx] = 1 - val
+            self.engine.set_step(ch_idx, step_idx, 1 - val)
         else:
-            self.engine.channels[ch_idx]['steps'][step_idx] = 0
+            self.engine.set_step(ch_idx, step_idx, 0)
         self.update_step_visual(ch_idx, step_idx)
 
     def update_step_visual(self, ch_idx, step_idx):
-        val = self.engine.channels[ch_idx]['steps'][step_idx]
-        grp = (step_idx // 4) % 2
-        if val: 
-            fill_col = self.C["bg_step_on"] if grp == 0 else self.C["bg_step_alt"]
+        r, c = ch_idx - self.rack_row0, step_idx - self.rack_col0
+        if not (0 <= r < self.rack_size[0] and 0 <= c < self.rack_size[1]): return  # scrolled out
+        rid = self.rack_cells[r][c]
+        steps = self.engine.channels[ch_idx]['steps']
+        if step_idx < len(steps):
+            self.view.set(self.cv_rack, rid, state='normal', fill=self.step_fill(step_idx, steps[step_idx]))
         else:
-            fill_col = self.C["bg_step_off"] if grp == 0 else "#263238"
-        rid = self.step_ids.get((ch_idx, step_idx))
-        if rid: self.cv_rack.itemconfig(rid, fill=fill_col)
+            self.view.set(self.cv_rack, rid, state='hidden')
 
     def on_channel_right_click(self, event, ch_idx):
         m = tk.Menu(self.root, tearoff=0, bg="#111", fg="#EEE")
         m.add_command(label="Rename...", command=lambda: self.rename_channel(ch_idx))
         m.add_command(label="Change Color...", command=lambda: self.color_channel(ch_idx))
+        route = tk.Menu(m, tearoff=0, bg="#111", fg="#EEE")
+        for i, ins in enumerate(self.engine.mixer):
+            route.add_command(label=f"{i}: {ins['name']}", command=lambda ii=i: self.route_channel(ch_idx, ii))
+        m.add_cascade(label="Route to Insert", menu=route)
+        m.add_separator()
+        if ch_idx in self.engine.frozen:
+            m.add_command(label="Unfreeze", command=lambda: self.freeze_channel(ch_idx, False))
+        else:
+            m.add_command(label="Freeze", command=lambda: self.freeze_channel(ch_idx, True))
         m.tk_popup(event.x_root, event.y_root)
 
+    def freeze_channel(self, ch_idx, on):
+        if on: self.engine.freeze_channel(ch_idx)
+        else: self.engine.unfreeze_channel(ch_idx)
+        self.refresh_rack()
+
+    def route_channel(self, ch_idx, ins_idx):
+        self.engine.set_channel(ch_idx, insert=ins_idx)
+
     def rename_channel(self, ch_idx):
         new_name = simpledialog.askstring("Rename", "New Name:", parent=self.root)
         if new_name:
             self.engine.channels[ch_idx]['name'] = new_name
-            self.draw_rack() # Redraw to update name
+            self.refresh_rack()
 
     def color_channel(self, ch_idx):
         col = colorchooser.askcolor(title="Choose Channel Color", parent=self.root)[1]
         if col:
             self.engine.channels[ch_idx]['color'] = col
-            self.draw_rack()
+            self.refresh_rack()
 
     def reset_knob(self, ch_idx, k_type):
-        if k_type == 'vol': self.engine.channels[ch_idx]['vol'] = 0.8
-        elif k_type == 'pan': self.engine.channels[ch_idx]['pan'] = 0.5
-        self.draw_rack()
+        if k_type == 'vol': self.engine.set_channel(ch_idx, vol=0.8)
+        elif k_type == 'pan': self.engine.set_channel(ch_idx, pan=0.5)
+        self.refresh_rack()
 
     def update_bpm(self, e):
-        try: self.engine.bpm = int(self.ent_bpm.get())
-        except: pass
+        try: self.engine.set_bpm(int(self.ent_bpm.get()))
+        except ValueError: pass
+        self.ent_bpm.delete(0, "end")  # show the tempo actually playing
+        self.ent_bpm.insert(0, str(self.engine.bpm))
             
+    def open_sample_dir(self, folder):
+        # Show it at once (from the index where it has been scanned before) and rescan behind
+        self.sample_dir = folder
+        self.fill_browser(folder)
+        if self.library is not None: self.library.scan(folder)
+
+    def fill_browser(self, folder, parent=""):
+        """List ``folder`` under ``parent`` (the tree root: the folder replaces the tree),
+        from the library index if it has the folder, else from the disk. Sub-folders get
+        a placeholder child, so they show as openable, and are listed whenever opened.
+        """
+        tree = self.browser
+        if not parent:
+            self.clear_browser()
+            parent = tree.insert("", "end", text=os.path.basename(folder.rstrip(os.sep)) or folder, open=True)
+            self.browser_paths[parent] = folder
+        listing = self.library.children(folder) if self.library is not None else None
+        if listing is None:
+            try:
+                listing = list_samples(folder)
+            except OSError:
+                listing = [], []
+        dirs, files = listing
+        for d in dirs:
+            item = tree.insert(parent, "end", text="📁 " + os.path.basename(d))
+            self.browser_paths[item] = d
+            tree.insert(item, "end", text="…")
+        for f in files:
+            self.browser_paths[tree.insert(parent, "end", text=os.path.basename(f))] = f
+
+    def clear_browser(self, item=""):
+        # Remove ``item``'s children (all of the tree for ""), forgetting their paths
+        for child in self.browser.get_children(item):
+            self.clear_browser(child)
+            self.browser_paths.pop(child, None)
+        self.browser.delete(*self.browser.get_children(item))
+
+    def on_browser_open(self, event):
+        item = self.browser.focus()
+        path = self.browser_paths.get(item)
+        if path and os.path.isdir(path):
+            self.clear_browser(item)
+            self.fill_browser(path, item)
+
+    def search_browser(self):
+        query = self.ent_search.get().strip()
+        if not query or self.library is None:
+            self.fill_browser(self.sample_dir)
+            return
+        self.clear_browser()
+        for path, duration in self.library.search(query, root=self.sample_dir):
+            text = os.path.basename(path) + (f"  {duration:.2f}s" if duration is not None else "")
+            self.browser_paths[self.browser.insert("", "end", text=text)] = path
+
+    def poll_library(self):
+        if self.library is None: return
+        text = self.browser_text
+        for msg in self.library.poll():
+            if msg[0] == 'progress':
+                text = f"Indexing {msg[1]}/{msg[2]}"
+            else:
+                text = "Browser - All"
+                if msg[0] == 'done' and (msg[1][1] or msg[1][2]) and self.ent_search.get().strip():
+                    self.search_browser()  # results from the finished index
+        if text != self.browser_text:
+            self.browser_text = text
+            self.lbl_browser.config(text=text)
+
+    def on_browser_click(self, event):
+        path = self.browser_paths.get(self.browser.identify_row(event.y))
+        if path and os.path.isfile(path) and self.rack_sel < len(self.engine.channels):
+            self.load_sample(self.rack_sel, path)
+
+    def choose_sample_dir(self):
+        d = filedialog.askdirectory(mustexist=True)
+        if d: self.open_sample_dir(d)
+
+    def load_sample(self, ch_idx, path):
+        try:
+            self.engine.load_sample(ch_idx, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Cat's Studio 26", f"Could not load sample:\n{e}")
+            return
+        self.refresh_rack()
+
+    PROJECT_TYPES = [("Cat's Studio 26 Project", "*.cat26")]
+
+    def open_project(self):
+        f = filedialog.askopenfilename(filetypes=self.PROJECT_TYPES)
+        if not f: return
+        try:
+            self.engine.load_project(f)
+        except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+            messagebox.showerror("Cat's Studio 26", f"Could not open project:\n{e}")
+            return
+        self.project_path = f
+        self.ent_bpm.delete(0, "end")
+        self.ent_bpm.insert(0, str(self.engine.bpm))
+        self.set_mode(self.engine.song_mode)
+        self.select_pattern(self.engine.pattern)
+        self.draw_playlist()
+        self.draw_mixer()
+
+    def save_project(self, ask=False):
+        f = self.project_path
+        if ask or not f:
+            f = filedialog.asksaveasfilename(defaultextension=".cat26", filetypes=self.PROJECT_TYPES)
+        if not f: return
+        try:
+            self.engine.save_project(f)
+        except OSError as e:
+            messagebox.showerror("Cat's Studio 26", f"Could not save project:\n{e}")
+            return
+        self.project_path = f
+
+    def dump_load(self):
+        f = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if f:
+            self.engine.load.dump_csv(f)
+
     def do_export(self):
+        if self.export_busy(): return
         f = filedialog.asksaveasfilename(defaultextension=".wav", filetypes=[("Wave", "*.wav")])
         if f:
-            self.engine.export_wav(f)
-            messagebox.showinfo("Cat's Studio 26", "Export Complete! 🎵")
+            self.start_export("Export Complete! 🎵", self.engine.export_wav, f, bars=self.engine.song_bars())
+
+    def do_export_stems(self):
+        if self.export_busy(): return
+        d = filedialog.askdirectory(mustexist=False)
+        if d:
+            self.start_export(f"Exported {len(self.engine.channels)} stems! 🎵", self.engine.export_stems, d, bars=self.engine.song_bars())
+
+    def export_busy(self):
+        if self.export_job is not None:
+            messagebox.showinfo("Cat's Studio 26", "An export is already running.")
+        return self.export_job is not None
+
+    def start_export(self, done, fn, *args, **kwargs):
+        # Renders on a worker thread; animate shows its progress and the outcome
+        self.export_job = ExportJob(fn, *args, **kwargs)
+        self.export_done = done
+
+    def cancel_export(self):
+        if self.export_job is not None: self.export_job.cancel()
+
+    def poll_export(self):
+        job = self.export_job
+        if job is None: return
+        text = self.export_text
+        for kind, value in job.poll():
+            if kind == 'progress':
+                text = "✕ CANCELLING" if job.cancelled.is_set() else f"✕ EXPORT {value:4.0%}"
+                continue
+            # Finished: report after this frame, so the dialog does not hold up animate
+            self.export_job, text = None, ""
+            if kind == 'done':
+                self.root.after_idle(messagebox.showinfo, "Cat's Studio 26", self.export_done)
+            elif kind == 'error':
+                self.root.after_idle(messagebox.showerror, "Cat's Studio 26", f"Export failed:\n{value}")
+        if text != self.export_text:
+            self.export_text = text
+            self.lbl_export.config(text=text)
 
     def animate(self):
+        # Everything below goes through the view model (whole pixels, so idle
+        # meters and playheads compare equal) and reaches Tk in one flush
+        view = self.view
+
         # 1. Update Mixer Meters
-        for mid, ch_idx in self.meter_ids:
-            if ch_idx is None: continue
-            
-            # Map engine meter index. Master is -1 in engine, but here we store logic differently
-            if ch_idx == -1: # Master
-                level = self.engine.meter_levels[-1]
-            else:
-                level = self.engine.meter_levels[ch_idx]
-                
-            h = level * 190
-            coords = self.cv_mixer.coords(mid)
-            if coords:
-                self.cv_mixer.coords(mid, coords[0], 280 - h, coords[2], 280)
-
-        # 2. Update Rack Playhead
+        for mid, ins_idx, mx in self.meter_ids:
+            h = round(float(self.engine.meter_levels[ins_idx]) * 190)
+            view.coords(self.cv_mixer, mid, (mx, 280 - h, mx + 8, 280))
+        for tid, ins_idx in self.cost_ids:
+            us = self.engine.insert_cost[ins_idx]
+            view.set(self.cv_mixer, tid, text=f"{us:.0f}µs" if us >= 0.5 else "")
+
+        # 2. Rack channel names: any edit to a frozen channel thaws it
+        chans = self.engine.channels
+        for r, (tag, strip, name, knobs) in enumerate(self.rack_rows or ()):
+            if self.rack_row0 + r < len(chans):
+                view.set(self.cv_rack, name, text=self.channel_label(self.rack_row0 + r))
+
+        # 3. Update Rack Playhead
         if self.engine.playing:
-            s = self.engine.current_step
-            x = 220 + s * 32
-            self.cv_rack.coords(self.playhead_id, x, 0, x, 220)
+            c = self.engine.current_step - self.rack_col0
+            x = self.RACK_STEP_X + c * self.RACK_STEP_W
+            view.set(self.cv_rack, self.playhead_id, state='normal' if 0 <= c < self.rack_size[1] else 'hidden')
+            view.coords(self.cv_rack, self.playhead_id, (x, 0, x, self.rack_height))
             
-            # Move playlist playhead (simulation)
-            px = 60 + (self.engine.sample_pos / 44100) * 100 # Arbitrary speed
-            px = px % 1000 # loop visually
-            self.cv_playlist.coords(self.playlist_playhead_id, px, 0, px, 600)
+            # Move playlist playhead (song position, or the looping pattern bar)
+            snap = self.engine.snapshot
+            bars = self.engine.sample_pos / snap.loop_len
+            loop = snap.song.length if snap.song_mode and snap.song.length else snap.pat_steps[snap.pattern] / 16
+            px = 60 + round((bars % loop) * 4 * self.BEAT_W)
+            view.coords(self.cv_playlist, self.playlist_playhead_id, (px, 0, px, 600))
             
             mins, secs = divmod(int(self.engine.sample_pos / 44100), 60)
-            self.lbl_time.config(text=f"{mins:03}:{secs:02}:00")
-
-        # 3. Scope
-        amp = self.engine.meter_levels[-1]
-        pts = []
-        t = time.time()
-        for i in range(0, 300, 5):
-            y = 30 + math.sin(i*0.1 + t*15) * (amp * 25) * math.sin(i*0.05)
-            pts.extend([i, y])
-        if len(pts) > 2:
-            self.cv_scope.coords(self.scope_line, *pts)
+            text = f"{mins:03}:{secs:02}:00"
+            if text != self.time_text:
+                self.time_text = text
+                self.lbl_time.config(text=text)
+
+        # 4. Scope and spectrum from the master tap, one coords call per line
+        tap = self.engine.tap
+        view.coords(self.cv_scope, self.scope_line, scope_points(tap.latest(SCOPE_WINDOW), 300, 60))
+        db = np.maximum(spectrum_db(tap.latest(SPECTRUM_FFT)), self.spectrum_db - 3)
+        self.spectrum_db = db
+        y = np.round(np.clip(db / -72, 0, 1) * 60)
+        view.coords(self.cv_spectrum, self.spectrum_line, np.column_stack([np.linspace(0, 160, len(y)), y]).ravel().tolist())
             
-        # CPU
-        cpu_h = random.randint(5, 14)
-        self.cpu_cv.coords(self.cpu_line, 0, 15, 60, 15-cpu_h)
-
+        # CPU: one pixel per block, newest on the right
+        load = self.engine.load
+        rows = load.recent(60)
+        if len(rows) > 1:
+            busy = rows[:, 2:].sum(axis=1) / (rows[:, 0] * (1e9 / SAMPLE_RATE))
+            x = np.arange(60 - len(rows), 60)
+            y = np.round(15 - np.minimum(busy, 1.0) * 15)
+            view.coords(self.cpu_cv, self.cpu_line, np.column_stack([x, y]).ravel().tolist())
+        mean, peak = load.load()
+        view.set(self.cpu_cv, self.cpu_line, fill="#F50057" if peak < 1 else "#FFEA00")
+        view.set(self.cpu_cv, self.cpu_text, text=f"{mean:4.0%} {load.xruns}xr")
+
+        # 5. Background export progress and outcome, library scan progress
+        self.poll_export()
+        self.poll_library()
+
+        view.flush()
         self.root.after(30, self.animate)
 
     def on_close(self):
-        if self.engine.stream:
-            self.engine.stream.stop()
-            self.engine.stream.close()
+        if self.export_job is not None:  # stop at the next batch so its temp files are removed
+            self.export_job.cancel()
+            self.export_job.thread.join()
+        if self.library is not None: self.library.stop(wait=INDEX_CLOSE_WAIT)
+        self.engine.stop()
         self.root.destroy()
 
-if __name__ == "__main__":
+# ═══════════════════════════════════════════════════════════════════════════════
+# SECTION 3: HEADLESS COMMANDS (no Tk, no audio device)
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def render_project(path, out, fmt='pcm16', bars=None, seconds=None, stems=False):
+    """Render one project file to ``out``; returns (out, audio seconds, wall seconds).
+    With ``stems``, ``out`` is a folder that gets one WAV per channel.
+    Runs in a pool worker, so it only touches numpy and the file system.
+    """
+    t0 = time.perf_counter()
+    engine = AudioEngine()
+    engine.load_project(path, background=False)
+    if bars is None and seconds is None: bars = engine.song_bars()
+    export = engine.export_stems if stems else engine.export_wav
+    frames = export(out, bars=bars, seconds=seconds, fmt=fmt)
+    return out, frames / SAMPLE_RATE, time.perf_counter() - t0
+
+def render_cli(argv):
+    ap = argparse.ArgumentParser(prog="catfl4k.py render", description="Render project files to WAV, one project per core.")
+    ap.add_argument("projects", nargs="+", help="project files (.cat26)")
+    ap.add_argument("-o", "--out-dir", help="output directory (default: next to each project)")
+    ap.add_argument("-f", "--format", choices=sorted(WAV_FORMATS), default="pcm16")
+    ap.add_argument("--bars", type=float, help="length in bars (default: the song, or 4 pattern loops)")
+    ap.add_argument("--seconds", type=float, help="length in seconds")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    ap.add_argument("--stems", action="store_true", help="write one WAV per channel into a folder per project")
+    args = ap.parse_args(argv)
+
+    if args.out_dir: os.makedirs(args.out_dir, exist_ok=True)
+    jobs = []
+    for path in args.projects:
+        name = os.path.splitext(os.path.basename(path))[0] + ("" if args.stems else ".wav")
+        jobs.append((path, os.path.join(args.out_dir or os.path.dirname(path), name)))
+    workers = max(1, min(args.jobs, len(jobs)))
+    t0 = time.perf_counter()
+    total, failed = 0.0, 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render_project, path, out, args.format, args.bars, args.seconds, args.stems): path for path, out in jobs}
+        for fut in as_completed(futures):
+            try:
+                out, audio, wall = fut.result()
+            except Exception as e:
+                print(f"FAILED {futures[fut]}: {e}", file=sys.stderr)
+                failed += 1
+                continue
+            total += audio
+            print(f"{out}: {audio:.1f}s audio in {wall:.2f}s ({audio / wall:.1f}x real time)")
+    wall = time.perf_counter() - t0
+    print(f"{len(jobs) - failed}/{len(jobs)} projects, {total:.1f}s audio in {wall:.2f}s "
+          f"({total / wall:.1f}x real time on {workers} worker{'s' if workers != 1 else ''})")
+    return 1 if failed else 0
+
+def play_cli(argv):
+    ap = argparse.ArgumentParser(prog="catfl4k.py play",
+                                 description="Play a project through the real-time callback without an audio device.")
+    ap.add_argument("project", help="project file (.cat26)")
+    ap.add_argument("-o", "--out", help="write the live output to this WAV (default: discard it)")
+    ap.add_argument("-f", "--format", choices=sorted(WAV_FORMATS), default="float32")
+    ap.add_argument("--bars", type=float, help="length in bars (default: the song, or 4 pattern loops)")
+    ap.add_argument("--seconds", type=float, help="length in seconds")
+    ap.add_argument("--speed", type=float, help="pace the virtual clock to this multiple of real time (default: flat out)")
+    args = ap.parse_args(argv)
+
+    engine = AudioEngine()
+    engine.load_project(args.project, background=False)
+    if args.seconds is not None:
+        frames = int(round(args.seconds * SAMPLE_RATE))
+    else:
+        frames = int((args.bars or engine.song_bars()) * engine.snapshot.loop_len)
+    if args.out:
+        backend = FileBackend(engine.callback, args.out, args.format, speed=args.speed)
+    else:
+        backend = NullBackend(engine.callback, speed=args.speed)
+    engine.render_passes()
+    engine.play_stop()
+    t0 = time.perf_counter()
+    played = backend.run(frames)
+    wall = time.perf_counter() - t0
+    backend.stop()
+    mean, peak = engine.load.load(LOAD_RING)
+    print(f"{played / SAMPLE_RATE:.1f}s audio in {wall:.2f}s ({played / SAMPLE_RATE / wall:.1f}x real time), "
+          f"DSP load {mean:.1%} mean / {peak:.1%} peak")
+    return 0
+
+# ─── Benchmarks ───────────────────────────────────────────────────────────────
+
+BENCH_BASE = {'voices': 16, 'channels': 8, 'block': 512, 'fx': 1}  # every axis is swept around this case
+BENCH_SWEEP = {'voices': (1, 8, 16, 32, 64), 'channels': (1, 4, 8, 16, 32, 64),
+               'block': (64, 128, 256, 512, 1024, 2048, 4096), 'fx': (0, 1, 2, 3)}
+BENCH_FX = ({'type': 'eq'}, {'type': 'comp'}, {'type': 'delay'})  # fx load n fills the first n slots
+BENCH_WARMUP = 8     # untimed blocks before each measurement
+BENCH_AUDIT = 64     # blocks traced for allocations after the timed run
+BENCH_FILTERS = ((20.0, 'high'), (30.0, 'high'), (80.0, 'high'), (1000.0, 'low'), (18000.0, 'low'))  # (Hz, type)
+BENCH_FILTER_BLOCKS = (64, 333, 512)  # block sizes each filter is checked at, odd ones included
+BENCH_FILTER_TOL = 1e-6  # max error against the direct-form reference, on 0.3 RMS noise
+BENCH_FREEZE_BPM = (120.0, 133.0, 97.3)  # tempos a frozen channel is checked at; steps are fractional at the last two
+BENCH_FREEZE_TOL = 1e-4  # max frozen vs live render difference (delay tails end at FREEZE_FLOOR)
+
+def bench_engine(channels, fx, frames):
+    """A synthetic project: ``channels`` noise samples ``frames`` long, routed
+    round-robin over the inserts, each insert carrying ``fx`` effects. Its one
+    pattern is empty, so only the voices the benchmark starts sound.
+    """
+    engine = AudioEngine()
+    data = (np.random.default_rng(KIT_SEED).standard_normal(frames) * 0.1).astype(np.float32)
+    engine.channels = [{'name': f'Noise {i + 1}', 'color': '#2962FF', 'vol': 0.8, 'pan': 0.5,
+                        'insert': 1 + i % (MIXER_INSERTS - 1), 'data': data} for i in range(channels)]
+    for ins in engine.mixer[1:]:
+        ins['fx'] = [dict(spec) for spec in BENCH_FX[:fx]] + [None] * (FX_SLOTS - fx)
+    engine.patterns = [engine.make_pattern('Bench', np.zeros((channels, 16)))]
+    engine._show_pattern(0)
+    engine.build_bank()
+    return engine
+
+def bench_case(voices, channels, block, fx, seconds=1.0):
+    """Time ``AudioEngine.callback`` on a synthetic project, then trace it for allocations.
+    Returns the case and its results as one JSON-ready dict.
+    """
+    blocks = max(16, int(seconds * SAMPLE_RATE / block))
+    calls = 1 + BENCH_WARMUP + blocks + BENCH_AUDIT
+    engine = bench_engine(channels, fx, calls * block + 1)  # no voice ends during the run
+    out = np.zeros((block, 2), dtype=np.float32)
+    engine.play_stop()
+    engine.callback(out, block, None, None)
+    snap = engine.snapshot
+    for v in range(voices):
+        c = v % channels
+        engine.voices.trigger(c, c, snap.inserts[c], snap.sample_off[c], snap.sample_len[c], snap.vol[c], snap.pan[c])
+    for _ in range(BENCH_WARMUP):
+        engine.callback(out, block, None, None)
+
+    ns = np.empty(blocks, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(blocks):
+        t = clock()
+        engine.callback(out, block, None, None)
+        ns[i] = clock() - t
+
+    tracing = tracemalloc.is_tracing()
+    engine.audit = AllocAudit(warmup=0, strict=False)
+    for _ in range(BENCH_AUDIT):
+        engine.callback(out, block, None, None)
+    if not tracing: tracemalloc.stop()
+
+    us = ns / 1e3
+    deadline = 1e6 * block / SAMPLE_RATE
+    return {'voices': voices, 'channels': channels, 'block': block, 'fx': fx, 'blocks': blocks,
+            'us_per_block': round(float(us.mean()), 2), 'us_p50': round(float(np.percentile(us, 50)), 2),
+            'us_p99': round(float(np.percentile(us, 99)), 2), 'us_max': round(float(us.max()), 2),
+            'deadline_us': round(deadline, 2), 'rt_factor': round(deadline / float(us.mean()), 2),
+            'alloc_blocks': engine.audit.failures, 'alloc_peak_bytes': engine.audit.worst}
+
+def sos_reference(sos, x):
+    """Direct-form I cascade in float64, one sample at a time: the slow, plainly
+    correct reference ``bench`` checks ``BiquadCascade`` against.
+    """
+    y = np.asarray(x, dtype=np.float64).tolist()
+    for b0, b1, b2, a0, a1, a2 in np.atleast_2d(sos):
+        b0, b1, b2, a1, a2 = b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0
+        x1 = x2 = y1 = y2 = 0.0
+        for n, v in enumerate(y):
+            r = b0 * v + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            x2, x1, y2, y1 = x1, v, y1, r
+            y[n] = r
+    return np.array(y)
+
+def bench_filters(seconds=2.0):
+    """Max error of the EQ's cascade (float32 buffers, block by block as in the callback)
+    against ``sos_reference``, per ``BENCH_FILTERS`` design and block size.
+    """
+    x = (np.random.default_rng(KIT_SEED).standard_normal(int(seconds * SAMPLE_RATE)) * 0.3).astype(np.float32)
+    results = []
+    for cutoff, btype in BENCH_FILTERS:
+        sos = butter_sos(2, cutoff, SAMPLE_RATE, btype)
+        ref = sos_reference(sos, x)
+        for block in BENCH_FILTER_BLOCKS:
+            filt, y = BiquadCascade(sos, 1), x[None, :].copy()
+            for b0 in range(0, len(x), block):
+                filt.process(y[:, b0:b0 + block])
+            results.append({'cutoff': cutoff, 'type': btype, 'block': block,
+                            'max_error': float(np.max(np.abs(y[0] - ref)))})
+    return results
+
+def bench_freeze(bars=8):
+    """Max difference between the offline render with channel 0 frozen and without,
+    per ``BENCH_FREEZE_BPM`` tempo. Channel 0 has shifted steps across a two-bar
+    pattern and a delay on its own insert, so the freeze bakes the delay.
+    """
+    results = []
+    for bpm in BENCH_FREEZE_BPM:
+        engine = bench_engine(2, 0, 2048)
+        engine.set_bpm(bpm)
+        engine.set_insert_fx(1, 0, {'type': 'delay', 'time': 180.0, 'feedback': 0.5})
+        engine.set_pattern_length(0, 32)
+        for s in range(0, 32, 3):
+            engine.set_step(0, s, 1, vel=0.5 + s / 64, shift=(s % 5 - 2) * 0.2)
+            engine.set_step(1, (s + 1) % 32, 1)
+        live = engine.render_offline(bars)
+        engine.freeze_channel(0)
+        frozen = engine.render_offline(bars)
+        n = len(live)  # the frozen render runs on with the delay tails baked past the dry samples
+        results.append({'bpm': bpm, 'max_error': float(np.max(np.abs(frozen[:n] - live)))})
+    return results
+
+def bench_cli(argv):
+    ap = argparse.ArgumentParser(prog="catfl4k.py bench",
+                                 description="Benchmark the audio callback on synthetic projects and check the "
+                                             "EQ filters' and track freeze's accuracy; results as JSON. "
+                                             "Fails if any callback block allocates past the audit's slack, or on filter or freeze error.")
+    ap.add_argument("-o", "--out", help="write the JSON results here (default: stdout)")
+    ap.add_argument("--seconds", type=float, default=1.0, help="audio timed per case (default: 1)")
+    for axis, values in BENCH_SWEEP.items():
+        ap.add_argument(f"--{axis}", type=lambda v: [int(x) for x in v.split(",")],
+                        default=list(values), help=f"values to sweep (default: {','.join(map(str, values))})")
+    args = ap.parse_args(argv)
+    if not all(1 <= v <= MAX_VOICES for v in args.voices) or not all(0 <= f <= FX_SLOTS for f in args.fx):
+        ap.error(f"voices must be 1-{MAX_VOICES}, fx 0-{FX_SLOTS}")
+    if not all(v >= 1 for v in args.channels + args.block):
+        ap.error("channels and block must be at least 1")
+
+    # One axis at a time around the base case, each distinct case once
+    cases = []
+    for axis in BENCH_SWEEP:
+        for v in getattr(args, axis):
+            case = dict(BENCH_BASE, **{axis: v})
+            if case not in cases: cases.append(case)
+    log = sys.stderr if args.out is None else sys.stdout
+    results = []
+    for case in cases:
+        r = bench_case(seconds=args.seconds, **case)
+        results.append(r)
+        print(f"voices {r['voices']:3d} channels {r['channels']:3d} block {r['block']:5d} fx {r['fx']}: "
+              f"{r['us_per_block']:9.1f} us/block (p99 {r['us_p99']:9.1f}), {r['rt_factor']:7.1f}x real time, "
+              f"{r['alloc_blocks']} blocks over the allocation slack (peak transient {r['alloc_peak_bytes']} B)", file=log)
+    filters = bench_filters()
+    for r in filters:
+        print(f"filter {r['type']:>4}-pass {r['cutoff']:7.0f} Hz block {r['block']:5d}: max error {r['max_error']:.1e}"
+              f"{'' if r['max_error'] <= BENCH_FILTER_TOL else ' FAIL'}", file=log)
+    freeze = bench_freeze()
+    for r in freeze:
+        print(f"freeze {r['bpm']:6.1f} BPM: max error {r['max_error']:.1e}"
+              f"{'' if r['max_error'] <= BENCH_FREEZE_TOL else ' FAIL'}", file=log)
+    report = {'format': 'catstudio26-bench', 'version': 1, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': sys.version.split()[0], 'numpy': np.__version__, 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'sample_rate': SAMPLE_RATE, 'base': BENCH_BASE, 'results': results,
+              'filter_tolerance': BENCH_FILTER_TOL, 'filters': filters,
+              'freeze_tolerance': BENCH_FREEZE_TOL, 'freeze': freeze}
+    text = json.dumps(report, indent=1)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(text + '\n')
+    else:
+        print(text)
+    failed = (any(r['alloc_blocks'] for r in results) or any(r['max_error'] > BENCH_FILTER_TOL for r in filters)
+              or any(r['max_error'] > BENCH_FREEZE_TOL for r in freeze))
+    return 1 if failed else 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["render"]:
+        return render_cli(argv[1:])
+    if argv[:1] == ["play"]:
+        return play_cli(argv[1:])
+    if argv[:1] == ["bench"]:
+        return bench_cli(argv[1:])
+    import_gui()
     root = tk.Tk()
     app = CatStudio26(root)
     root.mainloop()
+
+if __name__ == "__main__":
+    sys.exit(main())